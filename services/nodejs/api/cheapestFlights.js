@@ -3,7 +3,7 @@ const updateDirectRoutes = require('./directRouteHandler'); // Import the update
 
 module.exports = function(app, db, tequila) {
     app.get('/cheapestFlights', async (req, res) => {
-        const flightsCollection = db.collection('flights');
+        const flightsCollection = db.collection('flight_cache');
 
         const { origin, date_from: dateFrom, date_to: dateTo, price_to: priceTo = 500, limit = 100 } = req.query;
 
@@ -22,6 +22,7 @@ module.exports = function(app, db, tequila) {
             const cachedData = await flightsCollection.findOne(cacheKey);
 
             if (cachedData && (new Date().getTime() - cachedData.timestamp.getTime()) < 24 * 60 * 60 * 1000) {
+                res.set('X-Cache', 'HIT');
                 res.json(cachedData.results);
             } else {
                 const apiUrl = `${tequila.url}?fly_from=${origin}&date_from=${dateFrom}&date_to=${dateTo}&price_to=${priceTo}&one_for_city=1&limit=${limit}&partner=picky&curr=USD`;
@@ -42,6 +43,7 @@ module.exports = function(app, db, tequila) {
                         { upsert: true }
                     );
 
+                    res.set('X-Cache', 'MISS');
                     res.json(response.data);
                 } else {
                     res.status(500).send("No flight data found");
@@ -17,7 +17,7 @@ module.exports = function(app, db, tequila) {
         }
 
         try {
-            const flightsCollection = db.collection('flights');
+            const flightsCollection = db.collection('flight_cache');
             const airportsCollection = db.collection('airports');
             
             // First, get the destination airport's coordinates
@@ -33,6 +33,7 @@ module.exports = function(app, db, tequila) {
             
             if (cachedData && (Date.now() - cachedData.timestamp.getTime() < 24 * 60 * 60 * 1000)) {
                 console.log(`Serving cached results for ${destination}`);
+                res.set('X-Cache', 'HIT');
                 return res.json(cachedData.results);
             }
 
@@ -61,7 +62,7 @@ module.exports = function(app, db, tequila) {
             // Fetch data from all search circles in parallel
             await Promise.all(searchCircles.map(async (radiusParam) => {
                 try {
-                    const apiUrl = `https://api.tequila.kiwi.com/v2/search?fly_from=${radiusParam}&fly_to=${destination}&date_from=${encodedDates.from}&date_to=${encodedDates.to}&limit=${limit}&price_to=${priceTo}`;
+                    const apiUrl = `${tequila.url.replace(/\/search$/, '/v2/search')}?fly_from=${radiusParam}&fly_to=${destination}&date_from=${encodedDates.from}&date_to=${encodedDates.to}&limit=${limit}&price_to=${priceTo}`;
                     
                     const response = await axios.get(apiUrl, {
                         headers: { 'apikey': tequila.headers.apikey }
@@ -97,6 +98,7 @@ module.exports = function(app, db, tequila) {
                 ).catch(err => console.error(`Error caching results: ${err.message}`));
             }
             
+            res.set('X-Cache', 'MISS');
             return res.json(allResults);
         } catch (error) {
             console.error(`Error in cheapestFlightsTo: ${error.message}`);
@@ -104,6 +106,30 @@ module.exports = function(app, db, tequila) {
         }
     });
 
+    // Cheapest priced origins for a destination from the index built by utils/cheapest_origins.py:
+    // one read by _id, optionally narrowed to origins in one country
+    app.get('/cheapestOriginsTo', async (req, res) => {
+        const { destination, country, limit = 50 } = req.query;
+
+        if (!destination) {
+            return res.status(400).send('Destination is required');
+        }
+
+        try {
+            const id = country ? `${destination.toUpperCase()}:${country.toUpperCase()}` : destination.toUpperCase();
+            // The index keeps the 50 cheapest; a negative $slice would return the most expensive instead
+            const count = Math.min(Math.max(parseInt(limit, 10) || 50, 1), 50);
+            const entry = await db.collection('cheapest_origins').findOne(
+                { _id: id },
+                { projection: { origins: { $slice: count } } }
+            );
+            return res.json(entry ? entry.origins : []);
+        } catch (error) {
+            console.error(`Error in cheapestOriginsTo: ${error.message}`);
+            return res.status(500).send('Server error while reading cheapest origins');
+        }
+    });
+
     async function processDirectRoutes(flightsData) {
         const directFlights = flightsData.filter(flight => flight.route?.length === 1);
         if (!directFlights.length) return;
@@ -19,6 +19,7 @@ module.exports = function(app, db, tequilaConfig) {
                 const hoursDiff = (new Date() - cachedData.queriedAt) / (1000 * 60 * 60);
                 if (hoursDiff <= 24) {
                     flightsData = cachedData;
+                    res.set('X-Cache', 'HIT');
                     res.json(flightsData);
                     return;
                 }
@@ -53,6 +54,7 @@ module.exports = function(app, db, tequilaConfig) {
                     { $set: { data: flightsData, queriedAt: new Date() } },
                     { upsert: true }
                 );
+                res.set('X-Cache', 'MISS');
                 res.json(response.data);
                 processDirectRoutes(flightsData); // Additional handling for direct routes
             } else {
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from connections import get_db
+from price_flights import haversine
+
+CLUSTER_RADIUS_MILES = 60              # Airports of the same city within this distance share a metro cluster
+MEMBER_INTERVAL = timedelta(days=3)    # Non-representative members are harvested at most this often
+
+def normalize_city(city):
+    return ' '.join((city or '').lower().split())
+
+def build_clusters(airports, radius=CLUSTER_RADIUS_MILES):
+    """Group airports of the same city and country that lie within `radius` miles of each other.
+
+    Returns a list of clusters, each a dict with the representative (busiest airport by
+    weight, 1 being busiest) and its members. Single airports are not clusters.
+    """
+    groups = {}
+    for airport in airports:
+        if airport.get('iata_code') and airport.get('latitude') is not None and airport.get('longitude') is not None:
+            city = normalize_city(airport.get('city'))
+            if city:
+                groups.setdefault((airport.get('country'), city), []).append(airport)
+
+    clusters = []
+    for (country, _), group in groups.items():
+        # Union-find over pairs within the radius; city groups are small so pairwise is fine
+        parent = list(range(len(group)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(group)):
+            for j in range(i + 1, len(group)):
+                distance = haversine(group[i]['longitude'], group[i]['latitude'], group[j]['longitude'], group[j]['latitude'])
+                if distance <= radius:
+                    parent[find(i)] = find(j)
+
+        components = {}
+        for i, airport in enumerate(group):
+            components.setdefault(find(i), []).append(airport)
+        for members in components.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda airport: (airport.get('weight', 10), airport['iata_code']))
+            clusters.append({
+                '_id': members[0]['iata_code'],
+                'representative': members[0]['iata_code'],
+                'members': [airport['iata_code'] for airport in members],
+                'city': members[0].get('city'),
+                'country': country
+            })
+    return clusters
+
+def save_clusters(db, clusters):
+    """Persist clusters and tag each member airport with its cluster's representative."""
+    db.airport_clusters.delete_many({})
+    if clusters:
+        db.airport_clusters.insert_many(clusters)
+    db.airports.update_many({'metro': {'$exists': True}}, {'$unset': {'metro': ''}})
+    operations = [UpdateOne({'iata_code': code}, {'$set': {'metro': cluster['representative']}})
+                  for cluster in clusters for code in cluster['members']]
+    if operations:
+        db.airports.bulk_write(operations, ordered=False)
+
+def cluster_members(db):
+    """Map each non-representative member code to its representative."""
+    return {code: cluster['representative']
+            for cluster in db.airport_clusters.find()
+            for code in cluster['members'] if code != cluster['representative']}
+
+def due_for_harvest(db, codes, interval=MEMBER_INTERVAL):
+    """Keep representatives and unclustered airports every sweep; members only when their
+    last harvest is older than `interval`."""
+    members = cluster_members(db)
+    cutoff = datetime.now() - interval
+    recent = {state['_id'] for state in db.harvest_state.find(
+        {'_id': {'$in': [code for code in codes if code in members]}, 'harvested_at': {'$gte': cutoff}}, {'_id': 1})}
+    due = [code for code in codes if code not in recent]
+    print(f"Harvesting {len(due)} of {len(codes)} airports ({len(recent)} metro members skipped until due)")
+    return due
+
+def mark_harvested(db, code, writer=None):
+    update = {'$set': {'harvested_at': datetime.now()}}
+    if writer:
+        writer.update('harvest_state', {'_id': code}, update)
+    else:
+        db.harvest_state.update_one({'_id': code}, update, upsert=True)
+
+def main():
+    db = get_db()
+    airports = list(db.airports.find({}, {'iata_code': 1, 'city': 1, 'country': 1, 'latitude': 1, 'longitude': 1, 'weight': 1}))
+    clusters = build_clusters(airports)
+    save_clusters(db, clusters)
+    members = sum(len(cluster['members']) for cluster in clusters)
+    print(f"Saved {len(clusters)} metro clusters covering {members} airports")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sys
+import time
+import unicodedata
+
+INDEX_FILE = '../www/data/airport_index.json'
+MAX_PREFIX_LENGTH = 12  # Longer queries fall back to scanning the airports' word terms
+RESULTS_PER_PREFIX = 20
+
+# Match scores, mirroring getMatchScore in services/nodejs/api/airports.js (lower ranks first)
+EXACT_IATA = 1
+IATA_PREFIX = 4
+CITY_MATCH = 5
+COUNTRY_MATCH = 6
+NAME_MATCH = 7
+
+def normalize(text):
+    """ Lowercase and strip accents so 'Zürich' matches 'zurich' """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+def field_terms(text):
+    """ The whole field and each word in it, normalized """
+    text = normalize(text)
+    return [text] + text.replace('-', ' ').replace('/', ' ').split()
+
+def field_prefixes(text):
+    """ Prefixes of the whole field and of each word in it """
+    prefixes = set()
+    for term in field_terms(text):
+        for length in range(1, min(len(term), MAX_PREFIX_LENGTH) + 1):
+            prefixes.add(term[:length])
+    return prefixes
+
+def airport_scores(airport):
+    """ Return {prefix: best match score} for every prefix that should find this airport """
+    scores = {}
+
+    def add(prefixes, score):
+        for prefix in prefixes:
+            if score < scores.get(prefix, NAME_MATCH + 1):
+                scores[prefix] = score
+
+    iata = normalize(airport.get('iata_code'))
+    add(field_prefixes(airport.get('name')), NAME_MATCH)
+    add(field_prefixes(airport.get('country')), COUNTRY_MATCH)
+    add(field_prefixes(airport.get('city')), CITY_MATCH)
+    add(field_prefixes(iata), IATA_PREFIX)
+    if iata:
+        scores[iata] = EXACT_IATA
+    return scores
+
+def build_index(airports):
+    """Build a prefix -> ranked airport ids map from airport documents.
+
+    Candidates for a prefix are ranked by match score, then weight (1 is busiest,
+    see weight_airports.py), then IATA code, and truncated to RESULTS_PER_PREFIX.
+    """
+    airports = sorted((a for a in airports if a.get('iata_code')),
+                      key=lambda a: (a.get('weight', 10), a['iata_code']))
+    candidates = {}
+    for airport_id, airport in enumerate(airports):
+        for prefix, score in airport_scores(airport).items():
+            candidates.setdefault(prefix, []).append((score, airport_id))
+
+    prefixes = {}
+    for prefix, matches in candidates.items():
+        # Airports are already in weight order, so sorting by score keeps weight as the tie-break
+        matches.sort()
+        prefixes[prefix] = [airport_id for _, airport_id in matches[:RESULTS_PER_PREFIX]]
+
+    index = {
+        'fields': ['iata_code', 'name', 'city', 'country', 'weight'],
+        'airports': [[a['iata_code'], a.get('name'), a.get('city'), a.get('country'), a.get('weight', 10)]
+                     for a in airports],
+        'prefixes': prefixes
+    }
+    # Derived from the content, so an unchanged index keeps its version (and its artifact hash)
+    content = json.dumps(index, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return {'version': hashlib.sha256(content.encode('utf-8')).hexdigest()[:12], **index}
+
+def search(index, query, limit=10):
+    """Answer an autocomplete query from a loaded index without touching the database."""
+    query = normalize(query)
+    if not query:
+        return []
+    fields = index['fields']
+    if len(query) <= MAX_PREFIX_LENGTH:
+        ids = index['prefixes'].get(query, [])
+        return [dict(zip(fields, index['airports'][airport_id])) for airport_id in ids[:limit]]
+
+    # Longer than any indexed prefix, and the candidates of its first characters are already
+    # truncated: match the same word terms over every airport, ranked like the index
+    matches = []
+    for airport_id, row in enumerate(index['airports']):
+        airport = dict(zip(fields, row))
+        scores = [score for field, score in (('city', CITY_MATCH), ('country', COUNTRY_MATCH), ('name', NAME_MATCH))
+                  if any(term.startswith(query) for term in field_terms(airport[field]))]
+        if scores:
+            matches.append((min(scores), airport_id, airport))
+    matches.sort(key=lambda match: match[:2])
+    return [airport for _, _, airport in matches[:limit]]
+
+def write_index(index, output_file=INDEX_FILE):
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'), ensure_ascii=False)
+    os.replace(output_file + '.tmp', output_file)
+    print(f"Wrote {len(index['airports'])} airports and {len(index['prefixes'])} prefixes to {output_file}")
+
+def main(output_file=INDEX_FILE):
+    from connections import get_db
+
+    airports = get_db().airports.find({}, {'_id': 0, 'iata_code': 1, 'name': 1, 'city': 1, 'country': 1, 'weight': 1})
+    write_index(build_index(airports), output_file)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == 'search':
+        with open(INDEX_FILE, encoding='utf-8') as f:
+            index = json.load(f)
+        start = time.perf_counter()
+        results = search(index, ' '.join(sys.argv[2:]))
+        elapsed = (time.perf_counter() - start) * 1000
+        for airport in results:
+            print(f"{airport['iata_code']}  {airport['name']} ({airport['city']}, {airport['country']}) weight {airport['weight']}")
+        print(f"{len(results)} results in {elapsed:.3f} ms")
+    else:
+        main()
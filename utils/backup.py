@@ -0,0 +1,268 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Incremental backups only copy documents newer than the previous backup, using these fields;
+# collections without one are copied whole every time. A collection belongs here only if every
+# writer stamps the field: airports are updated by airports.py, weight_airports.py and
+# airport_clusters.py without a timestamp, and the pre-split flights collection holds schedule
+# documents that have none, so both are copied whole. Deletes leave no timestamp, so incremental
+# backups also record every collection's _ids, and a restore removes documents missing from them.
+# The utils scripts write string timestamps (YYYYMMDDHHMMSS) and the API writes Dates, so both
+# representations are compared.
+WATERMARK_FIELDS = {
+    'priced_routes': 'timestamp',
+    'flight_cache': 'timestamp',
+    'routes': 'timestamp',
+    'cache': 'queriedAt',
+}
+
+BATCH_SIZE = 1000
+MANIFEST = 'manifest.json'
+
+def open_client(uri=None):
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+    from connections import get_client
+    return get_client()
+
+def wait_for_server(client, timeout=60):
+    """Poll until the server answers ping, instead of sleeping a fixed time."""
+    from pymongo.errors import PyMongoError
+
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            client.admin.command('ping')
+            return
+        except PyMongoError as e:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"MongoDB not ready after {timeout}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+
+def open_writer(path, compression, level):
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb', compresslevel=level)
+
+def open_reader(path):
+    if path.endswith('.zst'):
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+def watermark_query(name, since):
+    """Match documents changed after `since` (a UTC datetime), or everything for full backups."""
+    field = WATERMARK_FIELDS.get(name)
+    if since is None or field is None:
+        return {}
+    # String timestamps are written in local time by datetime.now(); BSON dates are UTC
+    local_since = since.replace(tzinfo=timezone.utc).astimezone().strftime('%Y%m%d%H%M%S')
+    return {'$or': [
+        {field: {'$gt': local_since}},
+        {field: {'$gt': since}}
+    ]}
+
+def dump_collection(db, name, backup_dir, compression, level, since):
+    """Stream one collection's raw BSON into a compressed file in mongodump's .bson layout."""
+    from bson.codec_options import CodecOptions
+    from bson.raw_bson import RawBSONDocument
+
+    collection = db.get_collection(name, codec_options=CodecOptions(document_class=RawBSONDocument))
+    extension = 'zst' if compression == 'zstd' else 'gz'
+    path = os.path.join(backup_dir, f"{name}.bson.{extension}")
+    count = 0
+    with open_writer(path, compression, level) as writer:
+        for document in collection.find(watermark_query(name, since), batch_size=BATCH_SIZE):
+            writer.write(document.raw)
+            count += 1
+
+    result = {'file': os.path.basename(path), 'count': count}
+    if since is not None:
+        ids_path = os.path.join(backup_dir, f"{name}.ids.bson.{extension}")
+        with open_writer(ids_path, compression, level) as writer:
+            for document in collection.find({}, {'_id': 1}, batch_size=BATCH_SIZE):
+                writer.write(document.raw)
+        result['ids_file'] = os.path.basename(ids_path)
+
+    indexes = [{'key': list(spec['key']), 'name': index_name,
+                **{option: spec[option] for option in ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression') if option in spec}}
+               for index_name, spec in db[name].index_information().items() if index_name != '_id_']
+    print(f"Dumped {count} documents from {name}")
+    return {**result, 'indexes': indexes}
+
+def backup(db, backup_dir, compression='gzip', level=6, parallel=4, base_dir=None):
+    """Dump every collection in parallel; with base_dir, only documents newer than that backup."""
+    since = None
+    if base_dir:
+        with open(os.path.join(base_dir, MANIFEST)) as f:
+            since = datetime.fromisoformat(json.load(f)['started_at'])
+
+    os.makedirs(backup_dir, exist_ok=True)
+    started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    names = [name for name in db.list_collection_names() if not name.startswith('system.')]
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = dict(zip(names, executor.map(
+            lambda name: dump_collection(db, name, backup_dir, compression, level, since), names)))
+
+    manifest = {
+        'database': db.name,
+        'started_at': started_at.isoformat(),
+        'incremental_since': since.isoformat() if since else None,
+        'base': os.path.abspath(base_dir) if base_dir else None,
+        'collections': results
+    }
+    with open(os.path.join(backup_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    total = sum(result['count'] for result in results.values())
+    print(f"{'Incremental' if since else 'Full'} backup of {total} documents written to {backup_dir}")
+    return manifest
+
+def backup_chain(backup_dir):
+    """Return the backups needed to restore backup_dir, oldest (the full backup) first."""
+    chain = []
+    while backup_dir:
+        with open(os.path.join(backup_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+        chain.insert(0, (backup_dir, manifest))
+        backup_dir = manifest.get('base')
+    return chain
+
+def read_batches(path):
+    from bson import decode_file_iter
+    from bson.codec_options import CodecOptions
+    from bson.raw_bson import RawBSONDocument
+
+    options = CodecOptions(document_class=RawBSONDocument)
+    with open_reader(path) as reader:
+        batch = []
+        for document in decode_file_iter(reader, options):
+            batch.append(document)
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def load_collection(db, name, path, incremental, executor, slots):
+    """Feed batches from one dump file to the shared pool of insertion workers."""
+    from pymongo import ReplaceOne
+    from pymongo.errors import BulkWriteError
+
+    collection = db[name]
+
+    def insert(batch):
+        try:
+            if incremental:
+                collection.bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in batch], ordered=False)
+            else:
+                collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            print(f"{len(e.details['writeErrors'])} write errors restoring {name}")
+        finally:
+            slots.release()
+        return len(batch)
+
+    futures = []
+    for batch in read_batches(path):
+        slots.acquire()  # Bound the number of decoded batches held in memory
+        futures.append(executor.submit(insert, batch))
+    return sum(future.result() for future in futures)
+
+def prune_deleted(db, name, ids_path):
+    """Delete documents that no longer existed when the backup's _ids were recorded."""
+    keep = set()
+    for batch in read_batches(ids_path):
+        keep.update(document['_id'] for document in batch)
+    removed = 0
+    stale = []
+    for document in db[name].find({}, {'_id': 1}, batch_size=BATCH_SIZE):
+        if document['_id'] not in keep:
+            stale.append(document['_id'])
+        if len(stale) >= BATCH_SIZE:
+            removed += db[name].delete_many({'_id': {'$in': stale}}).deleted_count
+            stale = []
+    if stale:
+        removed += db[name].delete_many({'_id': {'$in': stale}}).deleted_count
+    return removed
+
+def restore(db, backup_dir, workers=8, drop=False):
+    """Restore a backup (and the full backup it builds on) with parallel insertion workers,
+    building indexes only after all data is loaded."""
+    chain = backup_chain(backup_dir)
+    names = set(chain[0][1]['collections'])
+    if drop:
+        for name in names:
+            db.drop_collection(name)
+
+    slots = threading.Semaphore(workers * 2)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for directory, manifest in chain:
+            incremental = manifest.get('incremental_since') is not None
+            with ThreadPoolExecutor(max_workers=len(manifest['collections']) or 1) as readers:
+                counts = dict(zip(manifest['collections'], readers.map(
+                    lambda item: load_collection(db, item[0], os.path.join(directory, item[1]['file']),
+                                                 incremental, executor, slots),
+                    manifest['collections'].items())))
+            print(f"Restored {sum(counts.values())} documents from {directory}")
+
+    # Replay deletes: only the newest backup's _ids tell which documents still existed
+    directory, manifest = chain[-1]
+    for name, entry in manifest['collections'].items():
+        if entry.get('ids_file'):
+            removed = prune_deleted(db, name, os.path.join(directory, entry['ids_file']))
+            if removed:
+                print(f"Removed {removed} {name} documents deleted before {directory}")
+
+    for name, entry in chain[-1][1]['collections'].items():
+        for index in entry['indexes']:
+            options = {key: value for key, value in index.items() if key not in ('key', 'name')}
+            db[name].create_index([tuple(pair) for pair in index['key']], name=index['name'], **options)
+    print(f"Indexes rebuilt for {len(chain[-1][1]['collections'])} collections")
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel, compressed MongoDB backup and restore")
+    parser.add_argument('--uri', help="MongoDB URI (default: the rsuser connection used by all utils)")
+    parser.add_argument('--database', default='rsdb')
+    parser.add_argument('--timeout', type=int, default=60, help="Seconds to wait for MongoDB to accept connections")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = subparsers.add_parser('backup')
+    backup_parser.add_argument('backup_dir', nargs='?',
+                               default=os.path.join(os.path.expanduser('~'), 'backup', 'mongodb',
+                                                    datetime.now().strftime('%Y%m%d_%H%M%S')))
+    backup_parser.add_argument('--compression', choices=['gzip', 'zstd'], default='gzip')
+    backup_parser.add_argument('--level', type=int, default=6)
+    backup_parser.add_argument('--parallel', type=int, default=4, help="Collections dumped at once")
+    backup_parser.add_argument('--incremental-from', dest='base_dir',
+                               help="Previous backup; only documents changed since it are dumped (collections "
+                                    "without a watermark field in full), plus every _id so restores drop deleted documents")
+
+    restore_parser = subparsers.add_parser('restore')
+    restore_parser.add_argument('backup_dir')
+    restore_parser.add_argument('--workers', type=int, default=8, help="Parallel insertion workers")
+    restore_parser.add_argument('--drop', action='store_true', help="Drop collections before restoring")
+
+    args = parser.parse_args()
+    client = open_client(args.uri)
+    wait_for_server(client, args.timeout)
+    db = client[args.database]
+
+    start = time.perf_counter()
+    if args.command == 'backup':
+        backup(db, args.backup_dir, args.compression, args.level, args.parallel, args.base_dir)
+    else:
+        restore(db, args.backup_dir, args.workers, args.drop)
+    print(f"{args.command.capitalize()} finished in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
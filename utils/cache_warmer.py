@@ -0,0 +1,206 @@
+import argparse
+import calendar
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+from connections import get_db, get_session
+
+# Mirrors the request and cache document shapes of services/nodejs/api/cheapestFlights.js and range.js
+TEQUILA_URL = 'https://api.tequila.kiwi.com/search'
+CACHE_TTL = timedelta(hours=24)
+REFRESH_MARGIN = timedelta(hours=4)   # Warm entries that would expire within this window
+DATE_WINDOWS = [(0, 7), (0, 30)]      # (start offset, length) in days for weight-ranked origins
+LOG_PATTERN = re.compile(r'\[(?P<time>[^\]]+)\] "GET (?P<path>/api/(?:cheapestFlights|range)\?\S*) HTTP')
+
+class RateLimiter:
+    """Token bucket shared by all warming threads."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(slot - now, 0))
+
+def js_date_ms(date_str):
+    """ Equivalent of new Date(date_str).getTime() for the YYYY-MM-DD dates the frontend sends """
+    return calendar.timegm(datetime.strptime(date_str, '%Y-%m-%d').timetuple()) * 1000
+
+def ms_to_date(ms):
+    """ Inverse of js_date_ms """
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).date().isoformat()
+
+def read_request_log(log_file, hours):
+    """Count recent cheapestFlights and range requests in the nginx access log by cache key."""
+    counts = Counter()
+    if not log_file or not os.path.exists(log_file):
+        return counts
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    with open(log_file, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = LOG_PATTERN.search(line)
+            if not match:
+                continue
+            try:
+                if datetime.strptime(match.group('time'), '%d/%b/%Y:%H:%M:%S %z') < cutoff:
+                    continue
+            except ValueError:
+                continue
+            url = urlsplit(match.group('path'))
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path.endswith('cheapestFlights') and params.get('origin') and params.get('date_from') and params.get('date_to'):
+                counts[('cheapestFlights', params['origin'], params['date_from'], params['date_to'])] += 1
+            elif url.path.endswith('range') and params.get('flyFrom') and params.get('flyTo'):
+                counts[('range', params['flyFrom'], params['flyTo'], params.get('dateFrom'), params.get('dateTo'))] += 1
+    return counts
+
+def is_fresh(db, key, now):
+    """True if the API would still serve this key from cache after the refresh margin."""
+    if key[0] == 'cheapestFlights':
+        try:
+            cache_key = cheapest_flights_cache_key(*key[1:])
+        except ValueError:
+            return True  # The API cannot cache dates it cannot parse either
+        cached = db.flight_cache.find_one(cache_key, {'timestamp': 1})
+        stamp = cached and cached.get('timestamp')
+    else:
+        cached = db.cache.find_one({'flight': range_cache_key(*key[1:])}, {'queriedAt': 1})
+        stamp = cached and cached.get('queriedAt')
+    return bool(stamp) and now - stamp < CACHE_TTL - REFRESH_MARGIN
+
+def candidate_keys(db, request_counts, top_origins, now):
+    """Score cache keys by recent demand and origin weight (1 is the busiest airport)."""
+    weights = {airport['iata_code']: airport.get('weight', 10)
+               for airport in db.airports.find({}, {'iata_code': 1, 'weight': 1})}
+    scores = Counter()
+    for key, count in request_counts.items():
+        scores[key] += count * 10 + (11 - weights.get(key[1], 10))
+
+    # Keys the API cached before are what users actually asked for
+    expiring = now - (CACHE_TTL - REFRESH_MARGIN)
+    for entry in db.flight_cache.find({'destination': 'Any', 'timestamp': {'$lt': expiring, '$gte': now - 2 * CACHE_TTL}},
+                                 {'origin': 1, 'fromDate': 1, 'toDate': 1}):
+        if isinstance(entry.get('fromDate'), (int, float)) and isinstance(entry.get('toDate'), (int, float)):
+            key = ('cheapestFlights', entry['origin'], ms_to_date(entry['fromDate']), ms_to_date(entry['toDate']))
+            scores[key] += 11 - weights.get(entry['origin'], 10)
+
+    today = now.date()
+    for code, weight in sorted(weights.items(), key=lambda item: item[1])[:top_origins]:
+        for offset, length in DATE_WINDOWS:
+            date_from = (today + timedelta(days=offset)).isoformat()
+            date_to = (today + timedelta(days=offset + length)).isoformat()
+            scores[('cheapestFlights', code, date_from, date_to)] += 11 - weight
+    return [key for key, _ in scores.most_common()]
+
+def cheapest_flights_cache_key(origin, date_from, date_to):
+    return {'origin': origin, 'destination': 'Any', 'fromDate': js_date_ms(date_from), 'toDate': js_date_ms(date_to)}
+
+def range_cache_key(fly_from, fly_to, date_from, date_to):
+    return f"{fly_from}-{fly_to}-{date_from or 'any'}-{date_to or 'any'}"
+
+def query_tequila(params, api_key, limiter, max_retries=3):
+    for attempt in range(max_retries):
+        limiter.wait()
+        response = get_session().get(TEQUILA_URL, params=params, headers={'apikey': api_key}, timeout=30)
+        if response.status_code == 429:
+            time.sleep(2 ** attempt)
+            continue
+        response.raise_for_status()
+        return response.json()
+    return None
+
+def update_direct_routes(db, flights):
+    """Same bookkeeping as directRouteHandler.js for the cheapest direct flight in a result set."""
+    direct = [flight for flight in flights if len(flight.get('route') or []) == 1]
+    if not direct:
+        return
+    cheapest = min(direct, key=lambda flight: flight['price'])
+    origin, destination = cheapest['route'][0]['flyFrom'], cheapest['route'][0]['flyTo']
+    departure = datetime.fromtimestamp(cheapest['dTime'], timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    existing = db.directRoutes.find_one({'origin': origin, 'destination': destination})
+    if existing and existing.get('price', 0) > cheapest['price']:
+        db.directRoutes.update_one({'_id': existing['_id']}, {'$set': {
+            'price': cheapest['price'], 'date': departure, 'timestamp': timestamp, 'source': 'tequila'}})
+    elif not existing:
+        db.directRoutes.insert_one({'origin': origin, 'destination': destination, 'price': cheapest['price'],
+                                    'date': departure, 'timestamp': timestamp, 'source': 'tequila'})
+
+def warm_key(db, key, api_key, limiter):
+    """Fetch one key from Tequila and write it in exactly the shape the API reads."""
+    if key[0] == 'cheapestFlights':
+        _, origin, date_from, date_to = key
+        params = {'fly_from': origin, 'date_from': date_from, 'date_to': date_to, 'price_to': 500,
+                  'one_for_city': 1, 'limit': 100, 'partner': 'picky', 'curr': 'USD'}
+        data = query_tequila(params, api_key, limiter)
+        if not data or 'data' not in data:
+            return False
+        data['data'].sort(key=lambda flight: flight['price'])
+        cache_key = cheapest_flights_cache_key(origin, date_from, date_to)
+        db.flight_cache.update_one(cache_key, {'$set': {**cache_key, 'timestamp': datetime.now(timezone.utc).replace(tzinfo=None),
+                                                   'results': data}}, upsert=True)
+    else:
+        _, fly_from, fly_to, date_from, date_to = key
+        params = {'fly_from': fly_from, 'fly_to': fly_to, 'one_per_date': 1, 'partner': 'picky', 'curr': 'USD'}
+        if date_from and date_to:
+            params.update(date_from=date_from, date_to=date_to)
+        data = query_tequila(params, api_key, limiter)
+        if not data or 'data' not in data:
+            return False
+        data['data'].sort(key=lambda flight: flight['price'])
+        db.cache.update_one({'flight': range_cache_key(fly_from, fly_to, date_from, date_to)},
+                            {'$set': {'data': data['data'], 'queriedAt': datetime.now(timezone.utc).replace(tzinfo=None)}},
+                            upsert=True)
+    update_direct_routes(db, data['data'])
+    return True
+
+def warm(db, api_key, log_file=None, log_hours=48, budget=200, concurrency=4, per_second=2, top_origins=25):
+    """Warm up to `budget` of the highest ranked cache keys that are missing or about to expire."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    request_counts = read_request_log(log_file, log_hours)
+    keys = [key for key in candidate_keys(db, request_counts, top_origins, now) if not is_fresh(db, key, now)][:budget]
+    print(f"Warming {len(keys)} cache entries ({len(request_counts)} distinct requests in the log)")
+
+    limiter = RateLimiter(per_second)
+    summary = Counter()
+
+    def run(key):
+        try:
+            summary['warmed' if warm_key(db, key, api_key, limiter) else 'empty'] += 1
+        except Exception as e:
+            print(f"Error warming {key}: {e}")
+            summary['failed'] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, keys))
+    print(f"Cache warming complete: {dict(summary)}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-populate the Node API's Tequila caches off-peak")
+    parser.add_argument('--log', default='/var/log/nginx/access.log', help="nginx access log with recent requests")
+    parser.add_argument('--log-hours', type=int, default=48)
+    parser.add_argument('--budget', type=int, default=200, help="Maximum upstream requests per run")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2, help="Upstream requests per second")
+    parser.add_argument('--top-origins', type=int, default=25, help="Weight-ranked origins warmed for default date windows")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv('TEQUILA_API_KEY')
+    if not api_key:
+        print("TEQUILA_API_KEY is not set.")
+        return
+    warm(get_db(), api_key, args.log, args.log_hours, args.budget, args.concurrency, args.rate, args.top_origins)
+
+if __name__ == "__main__":
+    main()
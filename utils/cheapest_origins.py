@@ -0,0 +1,164 @@
+import argparse
+import heapq
+from datetime import datetime
+from pymongo import ReplaceOne
+from connections import get_db
+
+# Materialized "cheapest ways to get to X" index read by /cheapestOriginsTo.
+# One document per destination (_id 'LHR') plus one per destination and origin country
+# (_id 'LHR:US'), each holding at most TOP_K origins sorted by price.
+# price_flights.py rebuilds it after each run; repricer.py and the Amadeus harvesters fold their
+# fares in with record_prices(). Anything else writing priced_routes needs a rebuild afterwards.
+TOP_K = 50
+INDEX_COLLECTION = 'cheapest_origins'
+
+def index_id(destination, country=None):
+    return f"{destination}:{country}" if country else destination
+
+def parse_price(value):
+    """Prices are floats from price_flights.py but strings from the Amadeus harvesters."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def origin_countries(db, codes=None):
+    query = {'iata_code': {'$in': list(codes)}} if codes is not None else {}
+    return {airport['iata_code']: airport.get('country') for airport in db.airports.find(query, {'iata_code': 1, 'country': 1})}
+
+def index_document(destination, country, entries, timestamp):
+    return {
+        '_id': index_id(destination, country),
+        'destination': destination,
+        'country': country,
+        'origins': [{'origin': origin, 'price': price, 'country': origin_country}
+                    for price, origin, origin_country in sorted(entries)],
+        'timestamp': timestamp
+    }
+
+def top_k_documents(flights, countries, k=TOP_K):
+    """Fold (origin, destination, price) rows into bounded heaps per destination and country bucket."""
+    heaps = {}
+    for origin, destination, price in flights:
+        country = countries.get(origin)
+        for bucket in ((destination, None), (destination, country)) if country else ((destination, None),):
+            heap = heaps.setdefault(bucket, [])
+            # Max-heap on price via negation, so the most expensive kept origin is evicted first
+            item = (-price, origin, country)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return [index_document(destination, country, [(-price, origin, origin_country) for price, origin, origin_country in heap], timestamp)
+            for (destination, country), heap in heaps.items()]
+
+def priced_flights(db, query=None):
+    """Yield (origin, destination, price) for every priced route document."""
+    for flight in db.priced_routes.find(query or {}, {'origin': 1, 'destination': 1, 'price': 1}):
+        price = parse_price(flight.get('price'))
+        if price is not None and flight.get('origin') and flight.get('destination'):
+            yield flight['origin'], flight['destination'], price
+
+def ensure_indexes(db):
+    db[INDEX_COLLECTION].create_index([('destination', 1), ('country', 1)])
+
+def build(db, k=TOP_K):
+    """Rebuild the whole index in one pass over the priced_routes collection."""
+    documents = top_k_documents(priced_flights(db), origin_countries(db), k)
+    collection = db[INDEX_COLLECTION]
+    for i in range(0, len(documents), 1000):
+        collection.bulk_write([ReplaceOne({'_id': document['_id']}, document, upsert=True)
+                               for document in documents[i:i + 1000]], ordered=False)
+    collection.delete_many({'_id': {'$nin': [document['_id'] for document in documents]}})
+    ensure_indexes(db)
+    print(f"Indexed cheapest origins for {sum(1 for document in documents if document['country'] is None)} destinations "
+          f"({len(documents)} index documents)")
+    return len(documents)
+
+def refresh_destinations(db, destinations, k=TOP_K):
+    """Recompute the index documents of a few destinations from their flights."""
+    destinations = list(destinations)
+    if not destinations:
+        return 0
+    flights = list(priced_flights(db, {'destination': {'$in': destinations}}))
+    documents = top_k_documents(flights, origin_countries(db, {origin for origin, _, _ in flights}), k)
+    collection = db[INDEX_COLLECTION]
+    if documents:
+        collection.bulk_write([ReplaceOne({'_id': document['_id']}, document, upsert=True) for document in documents], ordered=False)
+    collection.delete_many({'destination': {'$in': destinations}, '_id': {'$nin': [document['_id'] for document in documents]}})
+    return len(documents)
+
+def record_prices(db, prices, k=TOP_K):
+    """Fold changed (origin, destination, price) fares into the index incrementally.
+
+    A cheaper or new fare is merged into the kept list directly. A listed origin getting
+    more expensive from a full list may let an unlisted origin in, so that destination is
+    recomputed from its flights instead.
+    """
+    by_destination = {}
+    for origin, destination, price in prices:
+        price = parse_price(price)
+        if price is not None:
+            by_destination.setdefault(destination, {})[origin] = price
+    if not by_destination:
+        return 0
+
+    countries = origin_countries(db, {origin for changes in by_destination.values() for origin in changes})
+    existing = {}
+    for document in db[INDEX_COLLECTION].find({'destination': {'$in': list(by_destination)}}):
+        existing[document['_id']] = document
+
+    stale = set()
+    updates = []
+    for destination, changes in by_destination.items():
+        buckets = {}
+        for origin, price in changes.items():
+            for country in {None, countries.get(origin)}:
+                buckets.setdefault(country, {})[origin] = price
+        for country, bucket_changes in buckets.items():
+            document = existing.get(index_id(destination, country))
+            kept = {entry['origin']: (entry['price'], entry.get('country')) for entry in (document or {}).get('origins', [])}
+            if len(kept) >= k and any(origin in kept and price > kept[origin][0] for origin, price in bucket_changes.items()):
+                stale.add(destination)
+            for origin, price in bucket_changes.items():
+                kept[origin] = (price, countries.get(origin))
+            updates.append((destination, country, kept))
+
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    operations = []
+    for destination, country, kept in updates:
+        if destination not in stale:
+            entries = sorted((price, origin, origin_country) for origin, (price, origin_country) in kept.items())[:k]
+            operations.append(ReplaceOne({'_id': index_id(destination, country)},
+                                         index_document(destination, country, entries, timestamp), upsert=True))
+    if operations:
+        db[INDEX_COLLECTION].bulk_write(operations, ordered=False)
+    refresh_destinations(db, stale, k)
+    return len(by_destination)
+
+def show(db, destination, country=None):
+    document = db[INDEX_COLLECTION].find_one({'_id': index_id(destination, country)})
+    if not document:
+        print(f"No indexed origins for {index_id(destination, country)}")
+        return
+    for entry in document['origins']:
+        print(f"{entry['origin']} ({entry.get('country') or '?'}): ${entry['price']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-destination index of the cheapest origins")
+    parser.add_argument('command', nargs='?', choices=['build', 'show'], default='build')
+    parser.add_argument('destination', nargs='?')
+    parser.add_argument('--country', help="Only origins in this country (ISO code)")
+    parser.add_argument('--top', type=int, default=TOP_K, help="Origins kept per destination")
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        if not args.destination:
+            parser.error("show needs a destination")
+        show(get_db(), args.destination.upper(), args.country and args.country.upper())
+    else:
+        build(get_db(), args.top)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import csv
-import requests
-from bs4 import BeautifulSoup
+import sys
 from datetime import datetime
+from connections import fetch_page, get_db
+from negative_cache import NegativeCache
 
 # Function to convert date to YYYYMMDD format
 def convert_date(date_str):
@@ -22,29 +23,25 @@ def write_to_csv(file_name, data, header):
             writer.writeheader()
         writer.writerow(data)
 
-# Read the airports data
-airports = read_csv('filtered_airports.csv')
-
 # Header for the flights CSV
 flights_header = ['time', 'date', 'origin_iata', 'dest_iata', 'dest', 'flight', 'airline']
 
-# Iterate over each airport
-for airport in airports:
-    iata_code = airport['iata_code']
-    if not iata_code:
-        continue
-
-    print(f"Fetching data for IATA code: {iata_code}")
+def scrape_board(iata_code):
+    """ Fetch an airport's departures board and return one dict per flight row, or None if the fetch failed """
+    from bs4 import BeautifulSoup
 
     # Fetch data from Avionio
     url = f'https://www.avionio.com/en/airport/{iata_code}/departures'
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    content = fetch_page(url)
+    if content is None:
+        return None
+    soup = BeautifulSoup(content, 'html.parser')
 
     # Find all flight rows in the table
     flights = soup.find_all('tr')
 
     # Process each flight
+    rows = []
     for flight in flights[1:]:  # Skip the header row
         columns = flight.find_all('td')
         if len(columns) < 6:
@@ -54,7 +51,7 @@ for airport in airports:
         airline = columns[5].text.strip()
         airline = ' '.join([word for word in airline.split() if not word.isdigit()])
 
-        flight_data = {
+        rows.append({
             'time': columns[0].text.strip(),
             'date': convert_date(columns[1].text.strip()),
             'origin_iata': iata_code,
@@ -62,12 +59,33 @@ for airport in airports:
             'dest': columns[3].text.strip(),
             'flight': columns[4].text.strip(),
             'airline': airline
-        }
-
-        # Write to flights.csv
-        write_to_csv('flights.csv', flight_data, flights_header)
-
-    print(f"Data fetched and written for IATA code: {iata_code}")
-
-print("All data fetched and written to flights.csv")
-
+        })
+    return rows
+
+def main(probe_all=False):
+    # Read the airports data
+    airports = read_csv('filtered_airports.csv')
+
+    # Boards that keep coming back empty are re-probed with exponential backoff
+    empty_boards = NegativeCache(get_db(), 'avionio-departures', probe_all)
+    iata_codes = empty_boards.filter(airport['iata_code'] for airport in airports if airport['iata_code'])
+
+    # Iterate over each airport
+    for iata_code in iata_codes:
+        print(f"Fetching data for IATA code: {iata_code}")
+        rows = scrape_board(iata_code)
+        if rows is None:
+            continue  # Failed fetch: try again next sweep rather than backing off
+        if rows:
+            empty_boards.clear(iata_code)
+        else:
+            empty_boards.record(iata_code, 'empty')
+        for flight_data in rows:
+            # Write to flights.csv
+            write_to_csv('flights.csv', flight_data, flights_header)
+        print(f"Data fetched and written for IATA code: {iata_code}")
+
+    print("All data fetched and written to flights.csv")
+
+if __name__ == "__main__":
+    main(probe_all='--probe-all' in sys.argv[1:])
@@ -1,7 +1,18 @@
+import argparse
+import hashlib
 import json
+import math
 import os
 import requests
-import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+LOGO_URL = "https://www.gstatic.com/flights/airline_logos/70px/{code}.png"
+SYNC_STATE_FILE = '.sync_state.json'
+PLACEHOLDER_MIN_COUNT = 5  # Identical images served for at least this many codes are treated as placeholders
+TILE_SIZE = 70
 
 def download_airline_logo(airline_code, output_dir):
     # Create the output directory if it doesn't exist
@@ -61,15 +72,182 @@ def download_airline_logos(airline_codes_file, output_dir):
         except Exception as e:
             print(f"Error downloading logo for {name} ({code}). Error: {e}")
 
+def load_sync_state(output_dir):
+    """ Load validators and content hashes from the previous sync """
+    state_path = os.path.join(output_dir, SYNC_STATE_FILE)
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    return {'logos': {}, 'placeholders': []}
+
+def save_sync_state(output_dir, state):
+    state_path = os.path.join(output_dir, SYNC_STATE_FILE)
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(state_path + '.tmp', state_path)
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def sync_logo(session, code, output_dir, entry, placeholders):
+    """ Conditionally fetch one logo; returns (status, entry) where status is
+    'unchanged', 'updated', 'placeholder' or 'failed' """
+    logo_path = os.path.join(output_dir, f"{code}.png")
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    elif os.path.exists(logo_path):
+        headers['If-Modified-Since'] = formatdate(os.path.getmtime(logo_path), usegmt=True)
+
+    try:
+        response = session.get(LOGO_URL.format(code=code), headers=headers, timeout=10)
+    except requests.RequestException as e:
+        print(f"Error downloading logo for {code}. Error: {e}")
+        return 'failed', entry
+
+    if response.status_code == 304:
+        if 'sha256' not in entry and os.path.exists(logo_path):
+            entry = {**entry, 'sha256': file_sha256(logo_path)}
+        return 'unchanged', entry
+    if response.status_code != 200:
+        print(f"Failed to download logo for {code}. HTTP status code: {response.status_code}")
+        return 'failed', entry
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    entry = {'sha256': digest,
+             'etag': response.headers.get('ETag'),
+             'last_modified': response.headers.get('Last-Modified')}
+    if digest in placeholders:
+        return 'placeholder', entry
+    if os.path.exists(logo_path) and file_sha256(logo_path) == digest:
+        return 'unchanged', entry
+
+    with open(logo_path + '.tmp', 'wb') as f:
+        f.write(response.content)
+    os.replace(logo_path + '.tmp', logo_path)
+    return 'updated', entry
+
+def detect_placeholders(state, known=()):
+    """ Hashes shared by many unrelated airline codes are the CDN's generic placeholder """
+    counts = Counter(entry['sha256'] for entry in state['logos'].values() if entry.get('sha256'))
+    return sorted(set(known) | {digest for digest, count in counts.items() if count >= PLACEHOLDER_MIN_COUNT})
+
+def sync_airline_logos(airline_codes_file, output_dir, workers=16, prune=False):
+    """Concurrently sync logos, skipping unchanged files and placeholder images."""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    try:
+        with open(airline_codes_file, 'r') as file:
+            airline_codes = json.load(file)
+    except Exception as e:
+        print(f"Error loading airline codes from {airline_codes_file}: {e}")
+        return None
+
+    state = load_sync_state(output_dir)
+    placeholders = set(state.get('placeholders', []))
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    lock = threading.Lock()
+    summary = Counter()
+
+    def sync(code):
+        status, entry = sync_logo(session, code, output_dir, state['logos'].get(code, {}), placeholders)
+        with lock:
+            state['logos'][code] = entry
+            summary[status] += 1
+        if status == 'updated':
+            print(f"Downloaded logo for {airline_codes[code]} - {code}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(sync, sorted(airline_codes)))
+
+    state['placeholders'] = detect_placeholders(state, placeholders)
+    if prune:
+        for code, entry in state['logos'].items():
+            logo_path = os.path.join(output_dir, f"{code}.png")
+            if entry.get('sha256') in state['placeholders'] and os.path.exists(logo_path):
+                os.remove(logo_path)
+                summary['pruned'] += 1
+    save_sync_state(output_dir, state)
+    print(f"Logo sync complete: {dict(summary)}, {len(state['placeholders'])} placeholder hash(es)")
+    return state
+
+def build_sprite_atlas(output_dir, state, atlas_name='sprite'):
+    """Pack all real logos into one PNG, sharing tiles between identical images,
+    and write a JSON map of airline code to tile offset."""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Pillow is required to build the sprite atlas (pip install Pillow)")
+        return None
+
+    placeholders = set(state.get('placeholders', []))
+    tiles = {}    # sha256 -> tile index
+    offsets = {}  # code -> sha256
+    for code in sorted(state['logos']):
+        digest = state['logos'][code].get('sha256')
+        logo_path = os.path.join(output_dir, f"{code}.png")
+        if not digest or digest in placeholders or not os.path.exists(logo_path):
+            continue
+        tiles.setdefault(digest, (len(tiles), logo_path))
+        offsets[code] = digest
+
+    if not tiles:
+        print("No logos to pack into the sprite atlas")
+        return None
+
+    columns = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    atlas = Image.new('RGBA', (columns * TILE_SIZE, rows * TILE_SIZE), (0, 0, 0, 0))
+    for index, logo_path in tiles.values():
+        with Image.open(logo_path) as logo:
+            logo = logo.convert('RGBA')
+            if logo.size != (TILE_SIZE, TILE_SIZE):
+                logo.thumbnail((TILE_SIZE, TILE_SIZE))
+            atlas.paste(logo, ((index % columns) * TILE_SIZE, (index // columns) * TILE_SIZE))
+
+    # Kept RGBA: one palette shared by hundreds of brand colours and gradients bands visibly,
+    # and flat logo tiles compress well losslessly anyway
+    atlas.save(os.path.join(output_dir, f"{atlas_name}.png"), optimize=True, compress_level=9)
+
+    offset_map = {
+        'image': f"{atlas_name}.png",
+        'tile': TILE_SIZE,
+        'width': columns * TILE_SIZE,
+        'height': rows * TILE_SIZE,
+        'logos': {code: [(tiles[digest][0] % columns) * TILE_SIZE, (tiles[digest][0] // columns) * TILE_SIZE]
+                  for code, digest in offsets.items()}
+    }
+    with open(os.path.join(output_dir, f"{atlas_name}.json"), 'w') as f:
+        json.dump(offset_map, f, separators=(',', ':'), sort_keys=True)
+    print(f"Sprite atlas written with {len(tiles)} unique logos for {len(offsets)} airlines")
+    return offset_map
+
 # Configuration
 output_dir = '70px'
 
-# Check if an airline code is provided as a command-line argument
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        airline_code = sys.argv[1].upper()  # Convert to uppercase for consistency
+    parser = argparse.ArgumentParser(description="Download airline logos")
+    parser.add_argument('airline_code', nargs='?', help="Download a single airline's logo")
+    parser.add_argument('--sync', action='store_true', help="Concurrent incremental sync plus sprite atlas")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--prune', action='store_true', help="Delete logo files that are placeholder images")
+    parser.add_argument('--no-atlas', action='store_true')
+    args = parser.parse_args()
+
+    airline_codes_file = 'airlines.json'
+    if args.airline_code:
+        airline_code = args.airline_code.upper()  # Convert to uppercase for consistency
         download_airline_logo(airline_code, output_dir)
+    elif args.sync:
+        state = sync_airline_logos(airline_codes_file, output_dir, args.workers, args.prune)
+        if state and not args.no_atlas:
+            build_sprite_atlas(output_dir, state)
     else:
         # Default behavior: use the JSON file
-        airline_codes_file = 'airlines.json'
-        download_airline_logos(airline_codes_file, output_dir)
\ No newline at end of file
+        download_airline_logos(airline_codes_file, output_dir)
@@ -1,8 +1,20 @@
 import csv
-import re
-import requests
-from bs4 import BeautifulSoup
+import sys
+from contextlib import nullcontext
 from datetime import datetime
+from connections import fetch_page, get_db
+from negative_cache import NegativeCache
+from spool import pipelined
+
+# Error prefixes from scrape_flight_info: a missing page is worth backing off, a failed fetch is not
+NO_FLIGHT_INFO = 'No flight information found for'
+FETCH_FAILED = 'Could not fetch flight'
+
+def failure_reason(error):
+    """Negative cache reason for a scrape_flight_info error, or None for a transient failure."""
+    if error.startswith(FETCH_FAILED):
+        return None
+    return 'empty' if error.startswith(NO_FLIGHT_INFO) else 'error'
 
 def read_csv(file_name):
     """ Read CSV and return list of IATA codes """
@@ -26,9 +38,13 @@ def convert_time_format(time_str):
     return datetime.strptime(time_str, '%d %b %Y %H:%M').strftime('%Y%m%d%H%M')
 
 def scrape_departures(iata_code):
+    from bs4 import BeautifulSoup
+
     url = f"https://www.avionio.com/en/airport/{iata_code}/departures"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    content = fetch_page(url)
+    if content is None:
+        return None
+    soup = BeautifulSoup(content, 'html.parser')
     departures = []
     for row in soup.find_all('tr', class_="tt-row"):
         cols = row.find_all('td')
@@ -43,9 +59,13 @@ def scrape_departures(iata_code):
 
 def scrape_flight_info(flight_number):
     """ Scrape individual flight information """
+    from bs4 import BeautifulSoup
+
     url = f"https://www.avionio.com/en/flight/{flight_number}"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    content = fetch_page(url)
+    if content is None:
+        return 'N/A', 'N/A', 'N/A', f"{FETCH_FAILED} {flight_number}"
+    soup = BeautifulSoup(content, 'html.parser')
 
     departure_div = soup.find('div', id='flight-departure')
     arrival_div = soup.find('div', id='flight-arrival')
@@ -73,7 +93,7 @@ def scrape_flight_info(flight_number):
                 error_file.write(error_message + "\n")
             return 'N/A', 'N/A', 'N/A', error_message
 
-    return 'N/A', 'N/A', 'N/A', f"No flight information found for {flight_number}"
+    return 'N/A', 'N/A', 'N/A', f"{NO_FLIGHT_INFO} {flight_number}"
 
 def write_to_csv(data, file_name='flights.csv'):
     """ Write flight data to CSV """
@@ -81,26 +101,46 @@ def write_to_csv(data, file_name='flights.csv'):
         writer = csv.writer(file)
         writer.writerow(data)
 
-def main():
+def main(spool=False, probe_all=False):
+    """ Scrape every departure board into flights.csv; with spool=True also upsert each flight
+    into the flight_schedules collection through the spool, as flights_import.py would """
     print("Reading IATA codes from CSV...")
     iata_codes = read_csv('filtered_airports.csv')
 
-    for iata_code in iata_codes:
-        print(f"Processing departures for IATA code: {iata_code}")
-        departures = scrape_departures(iata_code)
-        if not departures:
-            print(f"No departures found for {iata_code}.")
-            continue
-        for flight in departures:
-            departure, arrival, duration, error = scrape_flight_info(flight['flight_number'])
-            if error:
-                with open('flights.err', 'a') as error_file:
-                    error_file.write(f"{error}\n")
-            else:
-                data = [iata_code, flight['dest_iata'], flight['flight_number'], departure, arrival, duration]
-                write_to_csv(data)
+    # Boards and flight pages that keep returning nothing are re-probed with exponential backoff
+    with pipelined() if spool else nullcontext() as writer:
+        empty_boards = NegativeCache(get_db(), 'avionio-departures', probe_all, writer)
+        empty_flights = NegativeCache(get_db(), 'avionio-flight', probe_all, writer)
+        for iata_code in empty_boards.filter(iata_codes):
+            print(f"Processing departures for IATA code: {iata_code}")
+            departures = scrape_departures(iata_code)
+            if departures is None:
+                continue  # Failed fetch: try again next run rather than backing off
+            if not departures:
+                print(f"No departures found for {iata_code}.")
+                empty_boards.record(iata_code, 'empty')
+                continue
+            empty_boards.clear(iata_code)
+            for flight in departures:
+                if empty_flights.skip(flight['flight_number']):
+                    continue
+                departure, arrival, duration, error = scrape_flight_info(flight['flight_number'])
+                if error:
+                    with open('flights.err', 'a') as error_file:
+                        error_file.write(f"{error}\n")
+                    reason = failure_reason(error)
+                    if reason:
+                        empty_flights.record(flight['flight_number'], reason)
+                else:
+                    empty_flights.clear(flight['flight_number'])
+                    data = [iata_code, flight['dest_iata'], flight['flight_number'], departure, arrival, duration]
+                    write_to_csv(data)
+                    if writer:
+                        writer.upsert('flight_schedules', {'flight_number': flight['flight_number']}, {
+                            'origin': iata_code, 'flight_number': flight['flight_number'], 'destination': flight['dest_iata'],
+                            'departure': departure, 'arrival': arrival, 'duration': duration})
 
     print("Flight data collection complete.")
 
 if __name__ == "__main__":
-    main()
+    main(spool='--spool' in sys.argv[1:], probe_all='--probe-all' in sys.argv[1:])
@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+# Load generator for the Node API with a stub standing in for Tequila.
+#
+#   python loadtest.py seed --mongo-uri mongodb://localhost:27017/rsdb_loadtest
+#   python loadtest.py stub --port 9100 --latency 0.3      (or let 'run' start it with --stub-port)
+#   TEQUILA_URL=http://localhost:9100/search MONGO_URL=mongodb://localhost:27017/rsdb_loadtest node app.js
+#   python loadtest.py run --target http://localhost:3000 --mix mixed --duration 60 --concurrency 50
+#
+# The API marks cache hits and misses with an X-Cache header, so hit ratios are reported per endpoint.
+# Only the standard library is needed, apart from pymongo for 'seed'.
+
+SEED_AIRPORTS = 200
+HOT_KEYS = 20           # Distinct keys the 'hot' part of a mix draws from, so most of them become cache hits
+HISTOGRAM_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+def airport_codes(count=SEED_AIRPORTS):
+    """Deterministic synthetic IATA codes: AAA, AAB, ..."""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return [letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26] for i in range(count)]
+
+def seed_airports(count=SEED_AIRPORTS, seed=1):
+    rng = random.Random(seed)
+    return [{
+        'iata_code': code,
+        'name': f"{code} International",
+        'city': f"City {code}",
+        'country': rng.choice(['US', 'GB', 'DE', 'FR', 'ES', 'IT', 'JP', 'BR']),
+        'latitude': round(rng.uniform(-50, 60), 6),
+        'longitude': round(rng.uniform(-120, 140), 6),
+        'weight': rng.randint(1, 10),
+        'type': 'airport'
+    } for code in airport_codes(count)]
+
+def seed_database(mongo_uri, count=SEED_AIRPORTS, seed=1):
+    """Load synthetic airports into a scratch database and clear the API caches."""
+    from pymongo import MongoClient
+
+    db = MongoClient(mongo_uri).get_default_database()
+    db.airports.delete_many({})
+    db.airports.insert_many(seed_airports(count, seed))
+    db.airports.create_index('iata_code')
+    for name in ('cache', 'directRoutes'):
+        db[name].delete_many({})
+    db.flight_cache.delete_many({})
+    db.flight_cache.create_index([('origin', 1), ('destination', 1), ('fromDate', 1), ('toDate', 1)])
+    db.cache.create_index('flight')
+    print(f"Seeded {count} airports into {db.name}")
+
+# --- Stub Tequila upstream -------------------------------------------------------------------
+
+class StubTequila:
+    """Minimal HTTP server answering /search and /v2/search with synthetic flights after a delay."""
+
+    def __init__(self, latency=0.3, jitter=0.1, error_rate=0.0, results=20, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.results = results
+        self.rng = random.Random(seed)
+        self.codes = airport_codes()
+        self.requests = Counter()
+        self.handlers = {}  # Connection handler task -> its writer
+
+    def flights(self, params):
+        fly_from = params.get('fly_from', 'AAA')
+        fly_to = params.get('fly_to')
+        # Same query, same flights, so repeated misses are comparable
+        rng = random.Random(f"{fly_from}-{fly_to}-{params.get('date_from')}-{params.get('date_to')}")
+        departure = int(time.time()) + 86400 * rng.randint(1, 30)
+        flights = []
+        for i in range(self.results):
+            origin = fly_from if len(fly_from) == 3 else rng.choice(self.codes)
+            destination = fly_to or rng.choice(self.codes)
+            direct = rng.random() < 0.5
+            route = [{'flyFrom': origin, 'flyTo': destination}] if direct else [
+                {'flyFrom': origin, 'flyTo': 'ZZZ'}, {'flyFrom': 'ZZZ', 'flyTo': destination}]
+            flights.append({
+                'id': f"{origin}{destination}{departure}{i}",
+                'flyFrom': origin,
+                'flyTo': destination,
+                'price': rng.randint(20, 900),
+                'dTime': departure + i * 3600,
+                'local_departure': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(departure + i * 3600)),
+                'route': route
+            })
+        return {'data': flights, 'currency': 'USD', '_results': len(flights)}
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.handlers[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0)):
+                    await reader.readexactly(int(headers['content-length']))
+
+                _, target, _ = request_line.decode('latin-1').split(' ', 2)
+                url = urlsplit(target)
+                self.requests[url.path] += 1
+                await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+                if self.rng.random() < self.error_rate:
+                    status, body = '503 Service Unavailable', b'{"error":"stub failure"}'
+                elif url.path in ('/search', '/v2/search'):
+                    params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                    status, body = '200 OK', json.dumps(self.flights(params)).encode()
+                else:
+                    status, body = '404 Not Found', b'{}'
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.handlers.pop(task, None)
+            writer.close()
+
+    async def start(self, host='0.0.0.0', port=9100):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Stub Tequila listening on {host}:{port} (latency {self.latency}s ± {self.jitter}s, "
+              f"error rate {self.error_rate:.0%})")
+        return server
+
+    async def stop(self, server):
+        server.close()
+        # Closing the transports lets each handler see EOF and return on its own
+        for writer in list(self.handlers.values()):
+            writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await server.wait_closed()
+
+# --- HTTP client ------------------------------------------------------------------------------
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection; each load worker owns one, so no pooling is needed."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path, timeout):
+        return await asyncio.wait_for(self._get(path), timeout)
+
+    async def _get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n\r\n".encode())
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, headers, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+# --- Traffic mixes ----------------------------------------------------------------------------
+
+def date_window(rng, hot):
+    start = date.today() + timedelta(days=rng.randint(1, 3) if hot else rng.randint(1, 120))
+    return start.isoformat(), (start + timedelta(days=7 if hot else rng.randint(1, 30))).isoformat()
+
+def cheapest_flights(rng, codes, hot):
+    date_from, date_to = date_window(rng, hot)
+    return 'cheapestFlights', {'origin': rng.choice(codes), 'date_from': date_from, 'date_to': date_to}
+
+def range_search(rng, codes, hot):
+    origin, destination = rng.sample(codes, 2)
+    date_from, date_to = date_window(rng, hot)
+    return 'range', {'flyFrom': origin, 'flyTo': destination, 'dateFrom': date_from, 'dateTo': date_to}
+
+def cheapest_flights_to(rng, codes, hot):
+    date_from, date_to = date_window(rng, hot)
+    return 'cheapestFlightsTo', {'destination': rng.choice(codes), 'date_from': date_from, 'date_to': date_to}
+
+def airports_search(rng, codes, hot):
+    code = rng.choice(codes)
+    return 'airports', {'query': code[:rng.randint(1, 3)]}
+
+def airports_all(rng, codes, hot):
+    return 'airports', {}
+
+# Mix name -> (share of requests drawn from the small hot key set, [(weight, request builder)])
+MIXES = {
+    'search': (0.8, [(5, cheapest_flights), (3, range_search), (2, cheapest_flights_to)]),
+    'browse': (0.9, [(6, airports_search), (2, airports_all), (2, cheapest_flights)]),
+    'cold': (0.0, [(4, cheapest_flights), (4, range_search), (2, cheapest_flights_to)]),
+    'mixed': (0.7, [(3, cheapest_flights), (2, range_search), (1, cheapest_flights_to), (3, airports_search), (1, airports_all)]),
+}
+
+class Traffic:
+    def __init__(self, mix, seed=1, codes=None):
+        self.hot_share, builders = MIXES[mix]
+        self.weights = [weight for weight, _ in builders]
+        self.builders = [builder for _, builder in builders]
+        self.rng = random.Random(seed)
+        self.codes = codes or airport_codes()
+        self.hot_codes = self.codes[:HOT_KEYS]
+
+    def next_request(self):
+        builder = self.rng.choices(self.builders, self.weights)[0]
+        hot = self.rng.random() < self.hot_share
+        # Hot requests reuse a handful of airports with a fixed seed per key, so their cache keys repeat
+        rng = random.Random(self.rng.randrange(HOT_KEYS)) if hot else self.rng
+        endpoint, params = builder(rng, self.hot_codes if hot else self.codes, hot)
+        return endpoint, f"/{endpoint}?{urlencode(params)}" if params else f"/{endpoint}"
+
+# --- Running and reporting --------------------------------------------------------------------
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.cache = defaultdict(Counter)
+
+    def record(self, endpoint, latency, status, cache_status):
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+        if cache_status:
+            self.cache[endpoint][cache_status] += 1
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def histogram(latencies):
+    counts = Counter()
+    for latency in latencies:
+        counts[next((bucket for bucket in HISTOGRAM_BUCKETS if latency <= bucket), math.inf)] += 1
+    return [(bucket, counts[bucket]) for bucket in HISTOGRAM_BUCKETS + [math.inf]]
+
+def summarize(results, elapsed):
+    summary = {}
+    for endpoint, latencies in sorted(results.latencies.items()):
+        values = sorted(latencies)
+        statuses = results.statuses[endpoint]
+        errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+        cache = results.cache[endpoint]
+        summary[endpoint] = {
+            'requests': len(values),
+            'throughput': len(values) / elapsed if elapsed else 0.0,
+            'error_rate': errors / len(values),
+            'statuses': {str(status): count for status, count in statuses.items()},
+            'p50': percentile(values, 0.5),
+            'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99),
+            'max': values[-1],
+            'cache_hit_ratio': cache['HIT'] / (cache['HIT'] + cache['MISS']) if cache['HIT'] + cache['MISS'] else None,
+            'histogram': [[bucket if bucket != math.inf else 'inf', count] for bucket, count in histogram(values)]
+        }
+    return summary
+
+def print_report(summary, elapsed, upstream_requests=None):
+    total = sum(entry['requests'] for entry in summary.values())
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+    print(f"{'endpoint':<18} {'reqs':>7} {'req/s':>7} {'err%':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'hit%':>6}")
+    for endpoint, entry in summary.items():
+        hit = f"{entry['cache_hit_ratio'] * 100:.0f}" if entry['cache_hit_ratio'] is not None else '-'
+        print(f"{endpoint:<18} {entry['requests']:>7} {entry['throughput']:>7.1f} {entry['error_rate'] * 100:>6.1f} "
+              f"{entry['p50'] * 1000:>8.1f} {entry['p90'] * 1000:>8.1f} {entry['p99'] * 1000:>8.1f} "
+              f"{entry['max'] * 1000:>8.1f} {hit:>6}")
+    for endpoint, entry in summary.items():
+        peak = max(count for _, count in entry['histogram']) or 1
+        print(f"\n{endpoint} latency histogram")
+        last = max(i for i, (_, count) in enumerate(entry['histogram']) if count)
+        for bucket, count in entry['histogram'][:last + 1]:
+            label = f"<= {bucket * 1000:g} ms" if bucket != 'inf' else f"> {HISTOGRAM_BUCKETS[-1] * 1000:g} ms"
+            print(f"  {label:>12} {count:>7} {'#' * round(40 * count / peak)}")
+    if upstream_requests is not None:
+        print(f"\nStub upstream requests: {dict(upstream_requests)}")
+
+async def worker(connection, traffic, results, deadline, timeout, pacer):
+    while time.monotonic() < deadline:
+        if pacer:
+            await pacer()
+        endpoint, path = traffic.next_request()
+        start = time.perf_counter()
+        try:
+            status, headers, _ = await connection.get(path, timeout)
+            results.record(endpoint, time.perf_counter() - start, status, headers.get('x-cache'))
+        except asyncio.TimeoutError:
+            connection.close()
+            results.record(endpoint, time.perf_counter() - start, 'timeout', None)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError) as e:
+            connection.close()
+            results.record(endpoint, time.perf_counter() - start, type(e).__name__, None)
+
+def make_pacer(rate):
+    """Open-loop pacing: hand out start slots at a fixed total rate across all workers."""
+    if not rate:
+        return None
+    interval = 1.0 / rate
+    next_slot = [time.monotonic()]
+
+    async def pace():
+        slot = max(next_slot[0], time.monotonic())
+        next_slot[0] = slot + interval
+        await asyncio.sleep(slot - time.monotonic())
+    return pace
+
+async def run_load(target, mix, duration, concurrency, rate=None, timeout=30.0, seed=1, stub=None, stub_port=None):
+    url = urlsplit(target)
+    server = await stub.start(port=stub_port) if stub else None
+    traffic = Traffic(mix, seed)
+    results = Results()
+    deadline = time.monotonic() + duration
+    pacer = make_pacer(rate)
+    connections = [Connection(url.hostname, url.port or 80) for _ in range(concurrency)]
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(connection, traffic, results, deadline, timeout, pacer) for connection in connections))
+    finally:
+        for connection in connections:
+            connection.close()
+        if server:
+            await stub.stop(server)
+    return results, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Node API against a stub Tequila upstream")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help="Load synthetic airports into a scratch MongoDB database")
+    seed_parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/rsdb_loadtest')
+    seed_parser.add_argument('--airports', type=int, default=SEED_AIRPORTS)
+
+    for name, help_text in (('stub', "Run only the stub Tequila upstream"), ('run', "Generate load against the API")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--latency', type=float, default=0.3, help="Mean stub upstream latency in seconds")
+        sub.add_argument('--jitter', type=float, default=0.1)
+        sub.add_argument('--error-rate', type=float, default=0.0, help="Share of stub responses that are 503s")
+        sub.add_argument('--seed', type=int, default=1)
+    subparsers.choices['stub'].add_argument('--port', type=int, default=9100)
+
+    run_parser = subparsers.choices['run']
+    run_parser.add_argument('--target', default='http://localhost:3000', help="Base URL of the Node API")
+    run_parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    run_parser.add_argument('--duration', type=float, default=30, help="Seconds to generate load")
+    run_parser.add_argument('--concurrency', type=int, default=20, help="Concurrent connections")
+    run_parser.add_argument('--rate', type=float, help="Total requests per second (default: as fast as responses allow)")
+    run_parser.add_argument('--timeout', type=float, default=30)
+    run_parser.add_argument('--stub-port', type=int, help="Also run the stub upstream in-process on this port")
+    run_parser.add_argument('--json', help="Write the summary to this file for comparing runs")
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        seed_database(args.mongo_uri, args.airports)
+        return
+
+    stub = StubTequila(args.latency, args.jitter, args.error_rate, seed=args.seed)
+    if args.command == 'stub':
+        async def serve():
+            server = await stub.start(port=args.port)
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            print(f"Stub stopped after {dict(stub.requests)}")
+        return
+
+    results, elapsed = asyncio.run(run_load(args.target, args.mix, args.duration, args.concurrency, args.rate,
+                                            args.timeout, args.seed, stub if args.stub_port else None, args.stub_port))
+    summary = summarize(results, elapsed)
+    print_report(summary, elapsed, stub.requests if args.stub_port else None)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'mix': args.mix, 'concurrency': args.concurrency, 'elapsed': elapsed, 'endpoints': summary}, f, indent=2)
+        print(f"Summary written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+from datetime import datetime, timedelta
+from connections import get_db
+
+# Lookups that keep coming back empty or failing (origins Amadeus has no data for, Avionio
+# boards and flight pages with "No flight information found") are recorded here and skipped
+# by later sweeps until their re-probe time: 1 day after the first failure, then 2, 4, 8...
+COLLECTION = 'negative_results'
+BASE_DELAY = timedelta(days=1)
+MAX_DELAY = timedelta(days=64)
+CHRONIC_FAILURES = 4   # Consecutive failures after which a key shows up in the report
+
+def retry_delay(failures):
+    return min(BASE_DELAY * 2 ** (failures - 1), MAX_DELAY)
+
+class NegativeCache:
+    """Negative results for one source (e.g. 'amadeus-prod'), loaded once per sweep."""
+
+    def __init__(self, db, source, probe_all=False, writer=None):
+        self.collection = db[COLLECTION]
+        self.source = source
+        self.probe_all = probe_all
+        self.writer = writer  # A SpoolWriter, so bookkeeping never waits on MongoDB during a sweep
+        now = datetime.now()
+        self.failures = {}
+        self.dead = set()
+        for entry in self.collection.find({'source': source}, {'key': 1, 'retry_at': 1, 'failures': 1}):
+            self.failures[entry['key']] = entry.get('failures', 0)
+            if entry['retry_at'] > now:
+                self.dead.add(entry['key'])
+
+    def skip(self, key):
+        return not self.probe_all and key in self.dead
+
+    def filter(self, keys):
+        """Drop keys that are still backing off, keeping order."""
+        keys = list(keys)
+        live = [key for key in keys if not self.skip(key)]
+        if len(live) < len(keys):
+            print(f"Skipping {len(keys) - len(live)} of {len(keys)} {self.source} keys with no data until their re-probe time")
+        return live
+
+    def record(self, key, reason):
+        """Record an empty or failed lookup and push its next probe out exponentially.
+
+        The failure count loaded at the start of the sweep decides the delay, so the write needs
+        no read back and can go through the spool.
+        """
+        now = datetime.now()
+        failures = self.failures.get(key, 0) + 1
+        query = {'_id': f"{self.source}:{key}"}
+        update = {'$inc': {'failures': 1},
+                  '$set': {'reason': reason, 'last_failed': now, 'retry_at': now + retry_delay(failures)},
+                  '$setOnInsert': {'source': self.source, 'key': key, 'first_failed': now}}
+        if self.writer:
+            self.writer.update(COLLECTION, query, update)
+        else:
+            self.collection.update_one(query, update, upsert=True)
+        self.failures[key] = failures
+        self.dead.add(key)
+
+    def clear(self, key):
+        """Forget a key that returned data again."""
+        if key in self.failures:
+            query = {'_id': f"{self.source}:{key}"}
+            if self.writer:
+                self.writer.delete(COLLECTION, query)
+            else:
+                self.collection.delete_one(query)
+            del self.failures[key]
+            self.dead.discard(key)
+
+def report(db, source=None, min_failures=CHRONIC_FAILURES):
+    """Return chronically empty keys, most failures first."""
+    query = {'failures': {'$gte': min_failures}}
+    if source:
+        query['source'] = source
+    return list(db[COLLECTION].find(query).sort([('failures', -1), ('key', 1)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Report or clear lookups that keep returning no data")
+    parser.add_argument('command', nargs='?', choices=['report', 'clear'], default='report')
+    parser.add_argument('--source', help="e.g. amadeus-prod, amadeus-test, amadeus-routes, avionio-departures, avionio-arrivals, avionio-flight")
+    parser.add_argument('--key', help="Only clear this key")
+    parser.add_argument('--min-failures', type=int, default=CHRONIC_FAILURES)
+    args = parser.parse_args()
+    db = get_db()
+
+    if args.command == 'clear':
+        query = {}
+        if args.source:
+            query['source'] = args.source
+        if args.key:
+            query['key'] = args.key
+        print(f"Cleared {db[COLLECTION].delete_many(query).deleted_count} negative results")
+        return
+
+    entries = report(db, args.source, args.min_failures)
+    for entry in entries:
+        print(f"{entry['source']:<20} {entry['key']:<12} {entry['failures']:>4} failures  {entry['reason']:<10} "
+              f"since {entry['first_failed']:%Y-%m-%d}, next probe {entry['retry_at']:%Y-%m-%d}")
+    print(f"{len(entries)} keys failed at least {args.min_failures} times in a row")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import csv
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Parses a large CSV on every core: the file is memory-mapped, cut into chunks that end on row
+# boundaries, and each chunk is parsed by a worker process. Results come back in file order, so
+# callers that keep the first occurrence of something get the same answer as a single pass.
+
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024   # Smaller files parse faster in-process than via a pool
+MIN_CHUNK_BYTES = 1024 * 1024
+CHUNKS_PER_WORKER = 4                  # Several chunks per worker even out uneven rows
+
+# Set in each worker by the pool initializer, so the filter is sent once per process, not per chunk
+_parse = None
+_state = None
+
+def intern_codes(codes):
+    """Map each code to a small integer, assigned in sorted order so every process agrees."""
+    return {code: index for index, code in enumerate(sorted(codes))}
+
+def chunk_ranges(mm, chunk_count):
+    """Split a mapped file into about chunk_count (start, end) ranges that end on row boundaries.
+
+    A newline inside a quoted field is not a row boundary, so quotes are counted up to each cut;
+    escaped quotes ("") come in pairs and do not change the parity.
+    """
+    size = len(mm)
+    step = max(size // chunk_count, MIN_CHUNK_BYTES)
+    ranges = []
+    start = scanned = 0
+    in_quotes = False
+    while start < size:
+        end = mm.find(b'\n', start + step) if start + step < size else -1
+        while end != -1:
+            in_quotes ^= mm[scanned:end].count(b'"') % 2 == 1
+            scanned = end
+            if not in_quotes:
+                break
+            end = mm.find(b'\n', end + 1)
+        if end == -1:
+            ranges.append((start, size))
+            break
+        ranges.append((start, end + 1))
+        start = end + 1
+    return ranges
+
+def _init_worker(parse, state):
+    global _parse, _state
+    _parse, _state = parse, state
+
+def _parse_range(path, start, end):
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8')
+    return _parse(csv.reader(io.StringIO(text, newline=None)), _state)
+
+def parse_file(path, parse, state, workers=None, min_parallel_bytes=MIN_PARALLEL_BYTES):
+    """Run parse(rows, state) over the CSV at path and return the per-chunk results in file order.
+
+    parse must be a module-level function so worker processes can find it.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or os.path.getsize(path) < min_parallel_bytes:
+        with open(path, mode='r', encoding='utf-8') as file:
+            return [parse(csv.reader(file), state)]
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ranges = chunk_ranges(mm, workers * CHUNKS_PER_WORKER)
+    workers = min(workers, len(ranges))
+    print(f"Parsing {path} in {len(ranges)} chunks on {workers} processes")
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(parse, state)) as pool:
+        return list(pool.map(_parse_range, [path] * len(ranges), *zip(*ranges)))
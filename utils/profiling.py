@@ -0,0 +1,117 @@
+import cProfile
+import io
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_ROOT = 'profiles'
+SAMPLE_INTERVAL = 0.005  # Seconds between wall-clock stack samples
+TOP_N = 15
+
+class StackSampler(threading.Thread):
+    """Samples every other thread's stack on a timer, so time spent waiting on
+    the network or MongoDB shows up as well as CPU time."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write_folded(self, path):
+        """Write stacks in the folded format read by flamegraph.pl and speedscope."""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def summarize(stats, top_n=TOP_N):
+    """Return the hottest functions by own time as printable lines."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top_n]
+    lines = [f"{'own s':>9} {'cum s':>9} {'calls':>10}  function"]
+    for (filename, line, name), (_, calls, own_time, cumulative, _) in rows:
+        lines.append(f"{own_time:9.3f} {cumulative:9.3f} {calls:10d}  {os.path.basename(filename)}:{line}({name})")
+    return lines
+
+@contextmanager
+def profile_run(name, output_root=PROFILE_ROOT, top_n=TOP_N):
+    """Profile the enclosed block with cProfile, a wall-clock stack sampler and tracemalloc,
+    writing everything to a per-run directory and printing the hottest functions."""
+    run_dir = os.path.join(output_root, f"{name}-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(run_dir, exist_ok=True)
+
+    tracemalloc.start(25)
+    sampler = StackSampler()
+    profiler = cProfile.Profile()
+    sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield run_dir
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(os.path.join(run_dir, 'cprofile.pstats'))
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(100)
+        with open(os.path.join(run_dir, 'cprofile.txt'), 'w') as f:
+            f.write(stream.getvalue())
+
+        sampler.write_folded(os.path.join(run_dir, 'stacks.folded'))
+
+        with open(os.path.join(run_dir, 'tracemalloc.txt'), 'w') as f:
+            f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n\n")
+            for stat in snapshot.statistics('lineno')[:50]:
+                f.write(f"{stat}\n")
+
+        print(f"\nProfile of {name}: {elapsed:.2f}s wall, peak memory {peak / 1024 / 1024:.1f} MiB, "
+              f"{sum(sampler.stacks.values())} stack samples")
+        for line in summarize(stats, top_n):
+            print(line)
+        print(f"Profile written to {run_dir}")
+
+def main():
+    """Run any utils script under the profiler: python profiling.py <script.py> [args...]"""
+    if len(sys.argv) < 2:
+        print("Usage: python profiling.py <script.py> [args...]")
+        sys.exit(1)
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    with profile_run(os.path.splitext(os.path.basename(script))[0]):
+        try:
+            runpy.run_path(script, run_name='__main__')
+        except SystemExit:
+            pass
+
+if __name__ == "__main__":
+    main()
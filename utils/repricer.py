@@ -0,0 +1,183 @@
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+from cheapest_origins import record_prices, refresh_destinations
+from connections import get_db
+from price_flights import price_between
+
+# Change streams need a replica set. For a local single-node one, start mongod with
+# --replSet rs0 and run rs.initiate() once in mongosh.
+# Delete events only carry the _id, so the repricer turns on pre-images for airports and routes
+# (MongoDB 6.0+) to learn which airport or route went away.
+
+BATCH_SIZE = 500        # Changes collected before repricing
+BATCH_WINDOW = 2.0      # Seconds to wait for more changes before repricing a partial batch
+CHECKPOINT_ID = 'repricer'
+PRICE_FIELDS = ('latitude', 'longitude', 'weight')
+
+def change_pipeline():
+    return [{'$match': {
+        'ns.coll': {'$in': ['airports', 'routes']},
+        'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}
+    }}]
+
+def enable_pre_images(db):
+    """Record deleted documents' contents for the change stream; returns False if unsupported."""
+    try:
+        for name in ('airports', 'routes'):
+            db.command('collMod', name, changeStreamPreAndPostImages={'enabled': True})
+        return True
+    except OperationFailure as e:
+        print(f"Pre-images unavailable ({e}); deleted routes are only dropped by 'price --rebuild'")
+        return False
+
+def affected_by(change):
+    """Return (airport codes, route pairs) whose prices a change can alter."""
+    if change['operationType'] == 'delete':
+        document = change.get('fullDocumentBeforeChange') or {}
+    else:
+        document = change.get('fullDocument') or {}
+    if change['ns']['coll'] == 'routes':
+        if document.get('origin') and document.get('destination'):
+            return set(), {(document['origin'], document['destination'])}
+        return set(), set()
+
+    if change['operationType'] == 'update':
+        updated = change.get('updateDescription', {}).get('updatedFields', {})
+        removed = change.get('updateDescription', {}).get('removedFields', [])
+        if not any(field in PRICE_FIELDS for field in list(updated) + removed):
+            return set(), set()
+    if document.get('iata_code'):
+        return {document['iata_code']}, set()
+    return set(), set()
+
+def remove_priced(db, pairs):
+    """Delete prices for routes or airports that no longer exist and refresh their destinations."""
+    pairs = list(pairs)
+    for start in range(0, len(pairs), BATCH_SIZE):
+        chunk = pairs[start:start + BATCH_SIZE]
+        db.priced_routes.delete_many({'$or': [{'origin': origin, 'destination': destination} for origin, destination in chunk]})
+    refresh_destinations(db, {destination for _, destination in pairs})
+    return len(pairs)
+
+def prune_deleted_airports(db):
+    """Without pre-images a deleted airport is unknown, so drop prices for any airport that is gone."""
+    codes = db.airports.distinct('iata_code')
+    stale = {(route['origin'], route['destination']) for route in db.priced_routes.find(
+        {'$or': [{'origin': {'$nin': codes}}, {'destination': {'$nin': codes}}]}, {'origin': 1, 'destination': 1})}
+    return remove_priced(db, stale) if stale else 0
+
+def reprice(db, airport_codes, route_pairs):
+    """Reprice and upsert only the routes touching the given airports or pairs.
+
+    Requested routes that no longer exist, and prices touching airports that no longer exist,
+    are removed along with their cheapest origins entries.
+    """
+    query = []
+    if airport_codes:
+        codes = list(airport_codes)
+        query += [{'origin': {'$in': codes}}, {'destination': {'$in': codes}}]
+    query += [{'origin': origin, 'destination': destination} for origin, destination in route_pairs]
+    if not query:
+        return 0
+
+    routes = {(route['origin'], route['destination'])
+              for route in db.routes.find({'$or': query}, {'origin': 1, 'destination': 1})}
+    codes = {code for pair in routes for code in pair}
+    airports = {airport['iata_code']: airport for airport in db.airports.find(
+        {'iata_code': {'$in': list(codes)}}, {'iata_code': 1, 'latitude': 1, 'longitude': 1, 'weight': 1})}
+
+    stale = {pair for pair in route_pairs if pair not in routes}
+    if airport_codes:
+        existing = set(db.airports.distinct('iata_code', {'iata_code': {'$in': list(airport_codes)}}))
+        codes_gone = [code for code in airport_codes if code not in existing]
+        if codes_gone:
+            stale |= {(route['origin'], route['destination']) for route in db.priced_routes.find(
+                {'$or': [{'origin': {'$in': codes_gone}}, {'destination': {'$in': codes_gone}}]},
+                {'origin': 1, 'destination': 1})}
+    if stale:
+        print(f"Removed prices for {remove_priced(db, stale)} deleted routes")
+
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    operations, prices = [], []
+    for origin, destination in routes:
+        if origin not in airports or destination not in airports:
+            continue
+        price = float(price_between(airports[origin], airports[destination]))
+        prices.append((origin, destination, price))
+        operations.append(UpdateOne(
+            {'origin': origin, 'destination': destination},
+            {'$set': {'origin': origin, 'destination': destination, 'price': price, 'timestamp': timestamp}},
+            upsert=True
+        ))
+    if operations:
+        db.priced_routes.bulk_write(operations, ordered=False)
+        record_prices(db, prices)
+    return len(operations)
+
+def load_checkpoint(db):
+    state = db.repricer_state.find_one({'_id': CHECKPOINT_ID})
+    return state.get('resume_token') if state else None
+
+def save_checkpoint(db, resume_token):
+    db.repricer_state.update_one(
+        {'_id': CHECKPOINT_ID},
+        {'$set': {'resume_token': resume_token, 'timestamp': datetime.now().strftime('%Y%m%d%H%M%S')}},
+        upsert=True
+    )
+
+def run(db):
+    """Watch airports and routes and reprice affected routes in micro-batches until interrupted."""
+    resume_token = load_checkpoint(db)
+    print("Resuming from checkpoint" if resume_token else "Starting from the current time")
+    options = {'full_document_before_change': 'whenAvailable'} if enable_pre_images(db) else {}
+    with db.watch(change_pipeline(), full_document='updateLookup', resume_after=resume_token,
+                  max_await_time_ms=int(BATCH_WINDOW * 1000), **options) as stream:
+        airport_codes, route_pairs = set(), set()
+        prune_airports = False
+        changes = 0
+        window_start = None
+        saved_token = resume_token
+        while stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                if (change['operationType'] == 'delete' and change['ns']['coll'] == 'airports'
+                        and not change.get('fullDocumentBeforeChange')):
+                    prune_airports = True
+                codes, pairs = affected_by(change)
+                airport_codes |= codes
+                route_pairs |= pairs
+                changes += 1
+                window_start = window_start or time.monotonic()
+
+            window_full = changes >= BATCH_SIZE
+            window_expired = window_start and time.monotonic() - window_start >= BATCH_WINDOW
+            if changes and (window_full or window_expired or change is None):
+                if prune_airports:
+                    prune_deleted_airports(db)
+                    prune_airports = False
+                repriced = reprice(db, airport_codes, route_pairs)
+                print(f"Repriced {repriced} routes for {changes} changes "
+                      f"({len(airport_codes)} airports, {len(route_pairs)} routes)")
+                airport_codes, route_pairs = set(), set()
+                changes = 0
+                window_start = None
+            if changes == 0 and stream.resume_token not in (None, saved_token):
+                # Nothing pending, so everything up to this token has been applied
+                save_checkpoint(db, stream.resume_token)
+                saved_token = stream.resume_token
+
+def main():
+    db = get_db()
+    try:
+        run(db)
+    except KeyboardInterrupt:
+        print("Repricer stopped.")
+    except OperationFailure as e:
+        print(f"Change streams are unavailable (is MongoDB running as a replica set?): {e}")
+    except PyMongoError as e:
+        print(f"MongoDB error in repricer: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 # Configuration
 BACKUP_DIR="/home/dbueno/backup/mongodb/20250228_133230"
 DOCKER_COMPOSE_DIR="/home/dbueno/repos/yoho"
+MAX_WAIT_ATTEMPTS=120  # Readiness checks, 0.5s apart, before giving up
 
 # Get the MongoDB root password from .env or prompt for it
 if [ -f "${DOCKER_COMPOSE_DIR}/.env" ]; then
@@ -29,9 +30,19 @@ docker run --rm -d --name mongo-restore \
   -p 27017:27017 \
   mongo:6.0 --noauth
 
-# Wait for MongoDB to start
+# Wait for MongoDB to accept connections
 echo "Waiting for MongoDB to start..."
-sleep 5
+ATTEMPTS=0
+until mongosh --quiet --host localhost:27017 --eval "db.adminCommand({ping:1})" > /dev/null 2>&1; do
+  ATTEMPTS=$((ATTEMPTS + 1))
+  if [ "${ATTEMPTS}" -ge "${MAX_WAIT_ATTEMPTS}" ]; then
+    echo "Error: temporary MongoDB container did not accept connections after ${MAX_WAIT_ATTEMPTS} attempts" >&2
+    docker logs --tail 20 mongo-restore >&2
+    docker stop mongo-restore > /dev/null 2>&1
+    exit 1
+  fi
+  sleep 0.5
+done
 
 # Step 3: Restore the database
 echo "Restoring database from backup: ${BACKUP_DIR}"
@@ -50,9 +61,17 @@ docker stop mongo-restore
 echo "Restarting MongoDB container..."
 docker-compose up -d mongodb
 
-# Step 7: Wait for MongoDB to start
+# Step 7: Wait for MongoDB to accept connections
 echo "Waiting for MongoDB to start..."
-sleep 10
+ATTEMPTS=0
+until docker exec yh-db mongosh --quiet --eval "db.adminCommand({ping:1})" > /dev/null 2>&1; do
+  ATTEMPTS=$((ATTEMPTS + 1))
+  if [ "${ATTEMPTS}" -ge "${MAX_WAIT_ATTEMPTS}" ]; then
+    echo "Error: MongoDB did not accept connections after ${MAX_WAIT_ATTEMPTS} attempts; check 'docker-compose logs mongodb'" >&2
+    exit 1
+  fi
+  sleep 0.5
+done
 
 # Step 8: Test connection
 echo "Testing connection to MongoDB..."
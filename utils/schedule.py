@@ -0,0 +1,161 @@
+import csv
+import re
+import sys
+from datetime import datetime, timedelta
+
+import arrivals
+import departures
+from connections import get_db
+from flights import failure_reason, read_csv, scrape_flight_info
+from negative_cache import NegativeCache
+
+schedule_header = ['origin', 'destination', 'flight_number', 'departure', 'arrival', 'duration', 'airline']
+
+TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+
+def normalize_flight_number(flight):
+    """ 'BA 117', 'ba-117' and 'BA117' all join as 'BA117' """
+    return re.sub(r'[\s-]', '', flight).upper()
+
+def board_timestamp(date, time_text):
+    """ Combine a board date (YYYYMMDD) and time (HH:MM) into YYYYMMDDHHMM """
+    match = TIME_PATTERN.search(time_text or '')
+    if not date or not match:
+        return None
+    return f"{date}{int(match.group(1)):02d}{match.group(2)}"
+
+def duration_between(departure, arrival):
+    """ Same HHhMMm format as flights.scrape_flight_info """
+    delta = datetime.strptime(arrival, '%Y%m%d%H%M') - datetime.strptime(departure, '%Y%m%d%H%M')
+    hours, remainder = divmod(delta.seconds, 3600)
+    return f"{hours:02d}h{remainder // 60:02d}m"
+
+def previous_day(date):
+    return (datetime.strptime(date, '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')
+
+class ScheduleJoin:
+    """Symmetric streaming hash join of departure and arrival board sightings.
+
+    A sighting waits in its side's table until the matching sighting of the same flight
+    between the same airports shows up on the other side. Arrivals also probe the previous
+    day so overnight flights join.
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.departures = {}  # (flight, origin, dest, departure date) -> sighting
+        self.arrivals = {}    # (flight, origin, dest, arrival date) -> sighting
+        self.seen = set()     # (flight, origin, dest, departure date) already emitted
+        self.joined = 0
+
+    def add_departure(self, row):
+        flight = normalize_flight_number(row['flight'])
+        key = (flight, row['origin_iata'], row['dest_iata'], row['date'])
+        if key in self.seen or key in self.departures:
+            return
+        for arrival_date in (row['date'], (datetime.strptime(row['date'], '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')):
+            arrival = self.arrivals.pop((flight, row['origin_iata'], row['dest_iata'], arrival_date), None)
+            if arrival:
+                self._join(key, row, arrival)
+                return
+        self.departures[key] = row
+
+    def add_arrival(self, row):
+        flight = normalize_flight_number(row['flight'])
+        arrival_key = (flight, row['origin_iata'], row['dest_iata'], row['date'])
+        if arrival_key in self.arrivals:
+            return
+        for departure_date in (row['date'], previous_day(row['date'])):
+            key = (flight, row['origin_iata'], row['dest_iata'], departure_date)
+            if key in self.seen:
+                return
+            departure = self.departures.pop(key, None)
+            if departure:
+                self._join(key, departure, row)
+                return
+        self.arrivals[arrival_key] = row
+
+    def _join(self, key, departure, arrival):
+        self.seen.add(key)
+        self.joined += 1
+        departure_time = board_timestamp(departure['date'], departure['time'])
+        arrival_time = board_timestamp(arrival['date'], arrival['time'])
+        self.emit({
+            'origin': departure['origin_iata'],
+            'destination': departure['dest_iata'],
+            'flight_number': key[0],
+            'departure': departure_time,
+            'arrival': arrival_time,
+            'duration': duration_between(departure_time, arrival_time) if departure_time and arrival_time else 'N/A',
+            'airline': departure['airline'] or arrival['airline']
+        })
+
+    def unmatched(self):
+        """Sightings still missing their other endpoint, as (key, sighting, side)."""
+        for key, row in self.departures.items():
+            yield key, row, 'departure'
+        for key, row in self.arrivals.items():
+            yield key, row, 'arrival'
+
+def build_schedule(airports_file='filtered_airports.csv', output_file='schedule.csv', fetch_missing=True, probe_all=False):
+    """Crawl each airport's departures and arrivals board once and write a deduplicated schedule.
+
+    Only flights whose other endpoint was never sighted (uncovered airport, or outside the
+    board window) fall back to the per-flight detail page.
+    """
+    iata_codes = read_csv(airports_file)
+    stats = {'boards': 0, 'details': 0, 'rows': 0}
+
+    with open(output_file, mode='w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=schedule_header)
+        writer.writeheader()
+
+        def emit(row):
+            writer.writerow(row)
+            stats['rows'] += 1
+
+        empty_flights = NegativeCache(get_db(), 'avionio-flight', probe_all)
+        join = ScheduleJoin(emit)
+        for iata_code in iata_codes:
+            print(f"Fetching boards for IATA code: {iata_code}")
+            for row in departures.scrape_board(iata_code) or []:
+                join.add_departure(row)
+            for row in arrivals.scrape_board(iata_code) or []:
+                join.add_arrival(row)
+            stats['boards'] += 2
+
+        for key, row, side in list(join.unmatched()):
+            flight_number = key[0]
+            sighted = board_timestamp(row['date'], row['time'])
+            departure, arrival = (sighted, None) if side == 'departure' else (None, sighted)
+            duration = 'N/A'
+            if fetch_missing and not empty_flights.skip(flight_number):
+                stats['details'] += 1
+                # The detail URL uses the board's own spelling, not the normalized join key
+                detail_departure, detail_arrival, detail_duration, error = scrape_flight_info(row['flight'])
+                if error:
+                    reason = failure_reason(error)
+                    if reason:
+                        empty_flights.record(flight_number, reason)
+                else:
+                    empty_flights.clear(flight_number)
+                    departure, arrival, duration = detail_departure, detail_arrival, detail_duration
+            emit({
+                'origin': row['origin_iata'],
+                'destination': row['dest_iata'],
+                'flight_number': flight_number,
+                'departure': departure or 'N/A',
+                'arrival': arrival or 'N/A',
+                'duration': duration,
+                'airline': row['airline']
+            })
+
+    print(f"Schedule written to {output_file}: {stats['rows']} flights ({join.joined} joined from boards), "
+          f"{stats['boards']} board requests, {stats['details']} flight detail requests")
+    return stats
+
+def main(probe_all=False):
+    build_schedule(probe_all=probe_all)
+
+if __name__ == "__main__":
+    main(probe_all='--probe-all' in sys.argv[1:])
@@ -0,0 +1,158 @@
+from pymongo import WriteConcern
+from pymongo.errors import OperationFailure, PyMongoError
+
+BATCH_SIZE = 5000
+
+# (keys, options) every rebuilt collection must have, matching split_flights.INDEXES; any other
+# index on the live collection is copied too
+INDEXES = {
+    'priced_routes': [
+        ([('origin', 1), ('destination', 1)], {'unique': True}),
+        ([('destination', 1), ('price', 1)], {}),
+    ],
+    'routes': [
+        ([('origin', 1), ('destination', 1)], {}),
+        ([('destination', 1)], {}),
+    ],
+}
+
+def shadow_name(name):
+    return f"{name}_shadow"
+
+def previous_name(name):
+    return f"{name}_previous"
+
+def load_shadow(db, name, documents):
+    """Bulk insert documents into a fresh, unindexed shadow collection with relaxed write concern."""
+    db.drop_collection(shadow_name(name))
+    shadow = db.get_collection(shadow_name(name), write_concern=WriteConcern(w=1, j=False))
+    batch = []
+    loaded = 0
+    keys = set()
+    for document in documents:
+        keys.add((document['origin'], document['destination']))
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            shadow.insert_many(batch, ordered=False)
+            loaded += len(batch)
+            batch = []
+    if batch:
+        shadow.insert_many(batch, ordered=False)
+        loaded += len(batch)
+    print(f"Loaded {loaded} documents into {shadow.name}")
+    return keys
+
+def copy_indexes(source, target):
+    """Create source's indexes (besides _id) on target with the same names and options; returns their keys."""
+    copied = set()
+    for index_name, spec in source.index_information().items():
+        if index_name == '_id_':
+            continue
+        options = {option: spec[option] for option in ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression') if option in spec}
+        target.create_index(spec['key'], name=index_name, **options)
+        copied.add(tuple(spec['key']))
+    return copied
+
+def build_indexes(db, name):
+    """Create indexes on the loaded shadow, mirroring the live collection's indexes.
+
+    The live specs go first and win: an INDEXES entry on the same keys is skipped, since creating
+    both would conflict on name or options (e.g. the unique pair index split_flights builds).
+    """
+    shadow = db[shadow_name(name)]
+    built = copy_indexes(db[name], shadow) if name in db.list_collection_names() else set()
+    for keys, options in INDEXES.get(name, []):
+        if tuple(keys) in built:
+            continue
+        try:
+            shadow.create_index(keys, **options)
+        except OperationFailure as e:
+            if not options.get('unique'):
+                raise
+            print(f"Could not create unique index {keys} on {shadow.name} ({e}); creating it as non-unique")
+            shadow.create_index(keys)
+
+def carry_over(db, name, shape_filter, rebuilt_keys):
+    """Copy live documents the rebuild does not replace into the shadow.
+
+    Documents outside shape_filter (e.g. API cache entries sharing the collection) are copied
+    server side; documents of the rebuilt shape are kept only if their origin/destination pair
+    was not rebuilt.
+    """
+    if name not in db.list_collection_names():
+        return
+    live = db[name]
+    shadow = db[shadow_name(name)]
+    if shape_filter:
+        live.aggregate([
+            {'$match': {'$nor': [shape_filter]}},
+            {'$merge': {'into': shadow.name, 'on': '_id', 'whenMatched': 'keepExisting', 'whenNotMatched': 'insert'}}
+        ])
+
+    batch = []
+    kept = 0
+    for document in live.find(shape_filter or {}):
+        if (document.get('origin'), document.get('destination')) in rebuilt_keys:
+            continue
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            shadow.insert_many(batch, ordered=False)
+            kept += len(batch)
+            batch = []
+    if batch:
+        shadow.insert_many(batch, ordered=False)
+        kept += len(batch)
+    print(f"Carried over {kept} {name} documents that were not rebuilt")
+
+def swap(db, name):
+    """Keep the live collection as <name>_previous, then atomically rename the shadow over it."""
+    if name in db.list_collection_names():
+        # $out keeps the target's old indexes and creates none, so start from a fresh
+        # collection and give it the live indexes; a rollback then restores them too
+        db.drop_collection(previous_name(name))
+        db[name].aggregate([{'$out': previous_name(name)}])
+        copy_indexes(db[name], db[previous_name(name)])
+    db[shadow_name(name)].rename(name, dropTarget=True)
+    print(f"Swapped {shadow_name(name)} into {name}; previous version kept as {previous_name(name)}")
+
+def rebuild(db, name, documents, shape_filter=None):
+    """Rebuild a collection off to the side and swap it in without readers seeing partial data.
+
+    documents is an iterable of new documents keyed by origin/destination; shape_filter selects
+    the live documents they supersede (None means the whole collection).
+    """
+    try:
+        rebuilt_keys = load_shadow(db, name, documents)
+        # Bulk load everything first, then index once
+        carry_over(db, name, shape_filter, rebuilt_keys)
+        build_indexes(db, name)
+        swap(db, name)
+        return True
+    except PyMongoError as e:
+        print(f"Error rebuilding {name}, live collection left untouched: {e}")
+        db.drop_collection(shadow_name(name))
+        return False
+
+def rollback(db, name):
+    """Restore the version that was live before the last swap."""
+    if previous_name(name) not in db.list_collection_names():
+        print(f"No previous version of {name} to roll back to")
+        return False
+    if name in db.list_collection_names():
+        # Versions kept before swap() copied indexes have only _id
+        try:
+            copy_indexes(db[name], db[previous_name(name)])
+        except OperationFailure as e:
+            print(f"Could not copy {name} indexes onto {previous_name(name)}: {e}")
+    db[previous_name(name)].rename(name, dropTarget=True)
+    print(f"Rolled {name} back to its previous version")
+    return True
+
+if __name__ == "__main__":
+    import sys
+    from connections import get_db
+
+    if len(sys.argv) != 3 or sys.argv[1] != 'rollback':
+        print("Usage: python shadow_rebuild.py rollback <collection>")
+        sys.exit(1)
+    rollback(get_db(), sys.argv[2])
@@ -0,0 +1,184 @@
+import argparse
+import time
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
+from connections import get_db
+from price_flights import PRICED_ROUTE_FILTER
+import shadow_rebuild
+
+# Online migration of the mixed-shape flights collection into one collection per shape:
+#
+#   priced_routes     origin/destination prices (price_flights.py, repricer.py, Amadeus harvesters)
+#   flight_schedules  scheduled flights keyed by flight_number (flights_import.py, flights.py --spool)
+#   flight_cache      Tequila cache entries (cheapestFlights.js, cheapestFlightsTo.js, cache_warmer.py)
+#
+# 1. python split_flights.py copy              copy while the old code still writes to flights; resumable
+#    python split_flights.py copy --restart    recopy right before deploying, to pick up in-place updates
+# 2. deploy the code that uses the new collections
+# 3. python split_flights.py copy --catch-up   pick up writes the old code made meanwhile, never
+#                                              overwriting what the new code has written since
+# 4. python split_flights.py verify
+# 5. python split_flights.py finish            rename flights to flights_presplit
+
+SOURCE = 'flights'
+RETIRED = 'flights_presplit'
+CHECKPOINT_ID = 'split_flights'
+BATCH_SIZE = 2000
+
+SHAPES = {
+    'priced_routes': PRICED_ROUTE_FILTER,
+    'flight_schedules': {'flight_number': {'$exists': True}},
+    'flight_cache': {'$or': [{'results': {'$exists': True}}, {'type': {'$exists': True}}]},
+}
+
+# (keys, options) per collection, built after the bulk copy
+INDEXES = {
+    'priced_routes': [
+        ([('origin', 1), ('destination', 1)], {'unique': True}),
+        ([('destination', 1), ('price', 1)], {}),
+    ],
+    'flight_schedules': [
+        ([('flight_number', 1)], {'unique': True}),
+        ([('origin', 1), ('destination', 1)], {}),
+    ],
+    'flight_cache': [
+        ([('origin', 1), ('destination', 1), ('fromDate', 1), ('toDate', 1)], {}),
+        ([('type', 1), ('destination', 1), ('dateFrom', 1), ('dateTo', 1)], {}),
+        # The API treats entries older than a day as stale; the warmer looks back two days
+        ([('timestamp', 1)], {'expireAfterSeconds': 7 * 24 * 3600}),
+    ],
+}
+
+def load_checkpoint(db):
+    state = db.migrations.find_one({'_id': CHECKPOINT_ID})
+    return state.get('last_ids', {}) if state else {}
+
+def save_checkpoint(db, last_ids):
+    db.migrations.update_one({'_id': CHECKPOINT_ID}, {'$set': {'last_ids': last_ids}}, upsert=True)
+
+def copy_shape(db, target, shape_filter, last_id=None, catch_up=False, batch_size=BATCH_SIZE, pause=0.0, on_batch=None):
+    """Copy one shape in _id order, batch by batch, returning the last copied _id.
+
+    Documents keep their _id, so a rerun replaces rather than duplicates. With catch_up=True,
+    documents already in the target are left alone, since the new code owns them by then.
+    """
+    source = db[SOURCE]
+    copied = 0
+    while True:
+        query = {'$and': [shape_filter, {'_id': {'$gt': last_id}}]} if last_id is not None else shape_filter
+        batch = list(source.find(query).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return last_id, copied
+        if catch_up:
+            operations = [UpdateOne({'_id': document['_id']}, {'$setOnInsert': {key: value for key, value in document.items() if key != '_id'}},
+                                    upsert=True) for document in batch]
+        else:
+            operations = [ReplaceOne({'_id': document['_id']}, document, upsert=True) for document in batch]
+        db[target].bulk_write(operations, ordered=False)
+        copied += len(batch)
+        last_id = batch[-1]['_id']
+        if on_batch:
+            on_batch(last_id)
+        if pause:
+            time.sleep(pause)  # Leave headroom for live traffic
+
+def build_indexes(db, target):
+    for keys, options in INDEXES[target]:
+        try:
+            db[target].create_index(keys, **options)
+        except OperationFailure as e:
+            if not options.get('unique'):
+                raise
+            # Duplicate keys from the mixed-shape era; keep the index for selectivity but not the constraint
+            print(f"Could not create unique index {keys} on {target} ({e}); creating it as non-unique")
+            db[target].create_index(keys)
+
+def copy(db, catch_up=False, restart=False, batch_size=BATCH_SIZE, pause=0.0):
+    if SOURCE not in db.list_collection_names():
+        print(f"No {SOURCE} collection to split")
+        return
+    # Catch-up passes rescan everything; only the first copy resumes from its checkpoint
+    last_ids = {} if restart or catch_up else load_checkpoint(db)
+    for target, shape_filter in SHAPES.items():
+        def checkpoint(last_id, target=target):
+            if not catch_up:
+                last_ids[target] = last_id
+                save_checkpoint(db, last_ids)
+
+        start = time.perf_counter()
+        _, copied = copy_shape(db, target, shape_filter, last_ids.get(target), catch_up, batch_size, pause, checkpoint)
+        build_indexes(db, target)
+        print(f"{'Caught up' if catch_up else 'Copied'} {copied} documents into {target} in {time.perf_counter() - start:.1f}s")
+
+def unclassified_filter():
+    return {'$nor': list(SHAPES.values())}
+
+def rebuild_index_conflicts():
+    """Indexes shadow_rebuild would create with other options than the split built, per collection.
+
+    A mismatch makes 'price_flights --rebuild' fail with IndexOptionsConflict once the split is live.
+    """
+    conflicts = []
+    for target, indexes in shadow_rebuild.INDEXES.items():
+        built = {tuple(keys): options for keys, options in INDEXES.get(target, [])}
+        for keys, options in indexes:
+            if tuple(keys) in built and built[tuple(keys)] != options:
+                conflicts.append((target, keys, built[tuple(keys)], options))
+    return conflicts
+
+def verify(db, batch_size=5000):
+    """Compare each shape in flights with its target; returns True if nothing is missing."""
+    ok = True
+    source = db[SOURCE]
+    for target, shape_filter in SHAPES.items():
+        expected = source.count_documents(shape_filter)
+        missing = 0
+        ids = []
+        for document in source.find(shape_filter, {'_id': 1}):
+            ids.append(document['_id'])
+            if len(ids) >= batch_size:
+                missing += len(ids) - db[target].count_documents({'_id': {'$in': ids}})
+                ids = []
+        if ids:
+            missing += len(ids) - db[target].count_documents({'_id': {'$in': ids}})
+        print(f"{target}: {expected} in {SOURCE}, {db[target].estimated_document_count()} in {target}, {missing} missing")
+        ok = ok and missing == 0
+
+    for target, keys, built, rebuilt in rebuild_index_conflicts():
+        print(f"{target}: split builds {keys} with {built} but shadow_rebuild uses {rebuilt}")
+        ok = False
+
+    unclassified = source.count_documents(unclassified_filter())
+    if unclassified:
+        print(f"{unclassified} {SOURCE} documents match no shape and stay behind in {RETIRED}")
+    return ok
+
+def finish(db, force=False):
+    if not force and not verify(db):
+        print("Documents are missing; run 'copy --catch-up' first (or pass --force)")
+        return False
+    db[SOURCE].rename(RETIRED, dropTarget=True)
+    db.migrations.delete_one({'_id': CHECKPOINT_ID})
+    print(f"Renamed {SOURCE} to {RETIRED}; drop it once the split collections have proven themselves")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the mixed-shape flights collection into one collection per shape")
+    parser.add_argument('command', choices=['copy', 'verify', 'finish'])
+    parser.add_argument('--catch-up', action='store_true', help="Copy only documents missing from the targets")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and copy from the start")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument('--force', action='store_true', help="Finish even if verification finds missing documents")
+    args = parser.parse_args()
+    db = get_db()
+
+    if args.command == 'copy':
+        copy(db, args.catch_up, args.restart, args.batch_size, args.pause)
+    elif args.command == 'verify':
+        verify(db)
+    else:
+        finish(db, args.force)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import argparse
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+# Durable local spool between fetchers and MongoDB.
+#
+# Fetchers append upserts (and deletes) to segment files as [length][crc32][BSON] records; a writer drains
+# sealed and open segments into MongoDB in bulk and checkpoints how far it got, so a slow or
+# unavailable database never stalls fetching and nothing fetched is lost on a crash.
+# Each writer process appends to its own segments, so several fetchers can share a spool directory.
+# Draining rewrites the shared checkpoint.json, so it happens under an flock on drain.lock: one
+# drainer per directory at a time, and the others skip their pass and leave the records to it.
+
+SPOOL_DIR = 'spool'
+HEADER = struct.Struct('<II')       # payload length, crc32 of payload
+SEGMENT_BYTES = 16 * 1024 * 1024    # Seal and start a new segment after this many bytes
+FSYNC_EVERY = 256                   # Records between fsyncs
+FSYNC_INTERVAL = 0.5                # Seconds between fsyncs
+OPEN_SUFFIX = '.open'
+SEALED_SUFFIX = '.spool'
+CORRUPT_SUFFIX = '.corrupt'
+CHECKPOINT_FILE = 'checkpoint.json'
+DRAIN_LOCK_FILE = 'drain.lock'
+DRAIN_BATCH = 1000
+RETRY_DELAY = 5                     # Seconds between drain attempts while MongoDB is unavailable
+
+def encode_record(record):
+    from bson import encode
+
+    payload = encode(record)
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class SpoolWriter:
+    """Append-only writer with batched fsync; thread safe so several fetch threads can share it."""
+
+    def __init__(self, directory=SPOOL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.file = None
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self._open_segment()
+
+    def _open_segment(self):
+        self.name = f"{time.time_ns():020d}-{os.getpid()}"
+        self.file = open(os.path.join(self.directory, self.name + OPEN_SUFFIX), 'ab')
+        fsync_dir(self.directory)
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def _seal(self):
+        self._sync()
+        self.file.close()
+        path = os.path.join(self.directory, self.name)
+        os.replace(path + OPEN_SUFFIX, path + SEALED_SUFFIX)
+        fsync_dir(self.directory)
+
+    def upsert(self, collection, query, values):
+        """Queue an upsert of `values` into `collection` for the document matching `query`."""
+        self._append({'c': collection, 'q': query, 's': values})
+
+    def update(self, collection, query, update):
+        """Queue an upsert with a full update document, e.g. {'$inc': ..., '$set': ...}."""
+        self._append({'c': collection, 'q': query, 'u': update})
+
+    def delete(self, collection, query):
+        """Queue deleting the document matching `query`."""
+        self._append({'c': collection, 'q': query, 'd': True})
+
+    def _append(self, record):
+        record = encode_record(record)
+        with self.lock:
+            self.file.write(record)
+            self.pending += 1
+            if self.pending >= FSYNC_EVERY or time.monotonic() - self.last_sync >= FSYNC_INTERVAL:
+                self._sync()
+            if self.file.tell() >= SEGMENT_BYTES:
+                self._seal()
+                self._open_segment()
+
+    def flush(self):
+        with self.lock:
+            self._sync()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self._seal()
+                self.file = None
+
+@contextmanager
+def drain_lock(directory, wait=True):
+    """Hold the directory's drain lock; yields False when another drainer has it and wait is False."""
+    with open(os.path.join(directory, DRAIN_LOCK_FILE), 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def load_checkpoint(directory):
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def save_checkpoint(directory, checkpoint):
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def segments(directory):
+    """Return (name, sealed) for every segment, oldest first."""
+    found = []
+    for filename in os.listdir(directory):
+        for suffix, sealed in ((SEALED_SUFFIX, True), (OPEN_SUFFIX, False)):
+            if filename.endswith(suffix):
+                found.append((filename[:-len(suffix)], sealed))
+    return sorted(found)
+
+def read_records(path, offset):
+    """Yield (end offset, record) for each complete record after offset; stops at a partial tail."""
+    from bson import decode
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, crc = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # Still being written
+            if zlib.crc32(payload) != crc:
+                raise ValueError(f"Corrupt record in {path} at offset {offset}")
+            offset += HEADER.size + length
+            yield offset, decode(payload)
+
+def to_operation(record):
+    from pymongo import DeleteOne, UpdateOne
+
+    if record.get('d'):
+        return DeleteOne(record['q'])
+    return UpdateOne(record['q'], record['u'] if 'u' in record else {'$set': record['s']}, upsert=True)
+
+def apply_batch(db, records):
+    """Write records in order, one ordered bulk per run of the same collection."""
+    run_collection, operations = None, []
+    for record in records + [None]:
+        if record is None or record['c'] != run_collection:
+            if operations:
+                db[run_collection].bulk_write(operations, ordered=True)
+            if record is None:
+                break
+            run_collection, operations = record['c'], []
+        operations.append(to_operation(record))
+
+def valid_length(path):
+    """Length of the complete, intact records at the start of a segment."""
+    end = 0
+    try:
+        for end, _ in read_records(path, 0):
+            pass
+    except ValueError:
+        pass
+    return end
+
+def writer_alive(name):
+    pid = int(name.rsplit('-', 1)[1])
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recover_open_segments(directory=SPOOL_DIR):
+    """Seal open segments left behind by writers that crashed, dropping any torn last record."""
+    if not os.path.isdir(directory):
+        return
+    with drain_lock(directory):
+        for name, sealed in segments(directory):
+            if sealed or writer_alive(name):
+                continue
+            path = os.path.join(directory, name + OPEN_SUFFIX)
+            length = valid_length(path)
+            if length < os.path.getsize(path):
+                print(f"Spool: dropping {os.path.getsize(path) - length} bytes of torn records from {name}")
+                os.truncate(path, length)
+            os.replace(path, os.path.join(directory, name + SEALED_SUFFIX))
+            print(f"Spool: sealed {name} left open by a stopped writer")
+        fsync_dir(directory)
+
+def drain_segment(db, directory, name, sealed, checkpoint, batch_size):
+    written = 0
+
+    def commit(batch, end):
+        apply_batch(db, batch)
+        checkpoint[name] = end
+        save_checkpoint(directory, checkpoint)
+        return len(batch)
+
+    path = os.path.join(directory, name + (SEALED_SUFFIX if sealed else OPEN_SUFFIX))
+    if not sealed and not os.path.exists(path):
+        # Sealed by its writer since it was listed
+        path, sealed = os.path.join(directory, name + SEALED_SUFFIX), True
+    end = checkpoint.get(name, 0)
+    batch = []
+    try:
+        for end, record in read_records(path, end):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                written += commit(batch, end)
+                batch = []
+    except ValueError:
+        if batch:
+            commit(batch, end)  # Keep what was read before the corrupt record
+        raise
+    if batch:
+        written += commit(batch, end)
+    if sealed and end >= os.path.getsize(path):
+        os.remove(path)
+        checkpoint.pop(name, None)
+        save_checkpoint(directory, checkpoint)
+    return written
+
+def drain_once(db, directory=SPOOL_DIR, batch_size=DRAIN_BATCH, wait=True):
+    """Drain everything currently in the spool; returns the number of records written.
+
+    With wait=False a pass is skipped (returning 0) while another process holds the drain lock.
+    MongoDB errors propagate so the caller can retry; a segment that vanished or is corrupt
+    is logged and skipped (corrupt sealed segments are set aside) without stopping the others.
+    """
+    from pymongo.errors import PyMongoError
+
+    with drain_lock(directory, wait) as locked:
+        if not locked:
+            return 0
+        checkpoint = load_checkpoint(directory)
+        written = 0
+        for name, sealed in segments(directory):
+            try:
+                written += drain_segment(db, directory, name, sealed, checkpoint, batch_size)
+            except PyMongoError:
+                raise
+            except FileNotFoundError as e:
+                print(f"Spool: segment {name} disappeared while draining, skipping: {e}")
+            except ValueError as e:
+                if not sealed:
+                    print(f"Spool: {e}; retrying {name} on the next pass")
+                    continue
+                print(f"Spool: {e}; moving {name} aside as {name + CORRUPT_SUFFIX}")
+                os.replace(os.path.join(directory, name + SEALED_SUFFIX), os.path.join(directory, name + CORRUPT_SUFFIX))
+                checkpoint.pop(name, None)
+                save_checkpoint(directory, checkpoint)
+        return written
+
+def drain(db, directory=SPOOL_DIR, follow=False, stop=None, poll_interval=0.5):
+    """Drain the spool into MongoDB, retrying while the database is unavailable.
+
+    With follow=True keep draining new records until `stop` is set, then drain once more.
+    Records that cannot be written by then stay in the spool for a later drain. While following,
+    passes are skipped when another drainer holds the lock; the final pass waits for it.
+    """
+    stop = stop or threading.Event()
+    try:
+        recover_open_segments(directory)
+    except OSError as e:
+        print(f"Spool: could not recover open segments in {directory}: {e}")
+    total = 0
+    while True:
+        stopping = stop.is_set()
+        try:
+            written = drain_once(db, directory, wait=stopping or not follow)
+        except Exception as e:  # Never let the drainer thread die; the records stay in the spool
+            if stopping:
+                print(f"Spool: could not drain, records left in {directory} for 'python spool.py drain': {e}")
+                return total
+            print(f"Spool: could not drain, retrying in {RETRY_DELAY}s: {e}")
+            stop.wait(RETRY_DELAY)
+            continue
+        total += written
+        if written:
+            print(f"Spool: wrote {written} records to MongoDB")
+        if not follow or stopping:
+            return total
+        stop.wait(poll_interval)
+
+@contextmanager
+def pipelined(directory=SPOOL_DIR):
+    """Yield a SpoolWriter for fetchers while a background thread drains it into MongoDB."""
+    from connections import get_db
+
+    writer = SpoolWriter(directory)
+    stop = threading.Event()
+    drainer = threading.Thread(target=drain, args=(get_db(), directory, True, stop), daemon=True)
+    drainer.start()
+    try:
+        yield writer
+    finally:
+        writer.close()
+        stop.set()
+        drainer.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain the fetch spool into MongoDB")
+    parser.add_argument('command', choices=['drain', 'status'])
+    parser.add_argument('--dir', default=SPOOL_DIR)
+    parser.add_argument('--follow', action='store_true', help="Keep draining new records until interrupted")
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        checkpoint = load_checkpoint(args.dir) if os.path.isdir(args.dir) else {}
+        for name, sealed in segments(args.dir) if os.path.isdir(args.dir) else []:
+            path = os.path.join(args.dir, name + (SEALED_SUFFIX if sealed else OPEN_SUFFIX))
+            print(f"{name} {'sealed' if sealed else 'open'}: {checkpoint.get(name, 0)}/{os.path.getsize(path)} bytes drained")
+        return
+
+    from connections import get_db
+    try:
+        total = drain(get_db(), args.dir, follow=args.follow)
+        print(f"Drained {total} records.")
+    except KeyboardInterrupt:
+        print("Drain stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime
+
+# Reference data served straight from www/ by nginx (services/nginx/nginx.conf) instead of
+# through the Node API and MongoDB. Each artifact is written once per content hash as
+# data/<name>.<hash>.json plus .gz and, when the brotli package is installed, .br siblings;
+# data/manifest.json maps artifact names to their current files.
+WWW_ROOT = '../www'
+DATA_DIR = 'data'
+MANIFEST_FILE = 'manifest.json'
+HASH_LENGTH = 12
+LOGO_DIR = 'assets/airline_logos/70px'
+AIRPORT_FIELDS = ('iata_code', 'name', 'city', 'country', 'latitude', 'longitude', 'weight', 'type')
+
+def encode(data):
+    return json.dumps(data, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+def compress_gzip(content):
+    # mtime=0 keeps the output, and so any ETag nginx derives from it, stable across runs
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+def compress_brotli(content):
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(content, quality=11)
+
+def write_atomic(path, content):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+def write_artifact(data_dir, name, data):
+    """Write one artifact and its precompressed variants; returns its manifest entry."""
+    content = encode(data)
+    digest = hashlib.sha256(content).hexdigest()
+    filename = f"{name}.{digest[:HASH_LENGTH]}.json"
+    path = os.path.join(data_dir, filename)
+    entry = {'file': f"{DATA_DIR}/{filename}", 'sha256': digest, 'bytes': len(content)}
+
+    variants = {'': content, '.gz': compress_gzip(content), '.br': compress_brotli(content)}
+    for suffix, variant in variants.items():
+        if variant is None:
+            continue
+        if not os.path.exists(path + suffix):
+            write_atomic(path + suffix, variant)
+        if suffix:
+            entry[f"{suffix[1:]}_bytes"] = len(variant)
+    return entry
+
+def airports_artifact(db):
+    airports = db.airports.find({}, {'_id': 0, **{field: 1 for field in AIRPORT_FIELDS}})
+    return sorted(airports, key=lambda airport: airport.get('iata_code') or '')
+
+def airlines_artifact(www_root):
+    with open(os.path.join(www_root, 'assets', 'airlines.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+def logos_artifact(www_root):
+    """Map airline codes to their logo file, leaving out CDN placeholder images."""
+    from fetchLogos import PLACEHOLDER_MIN_COUNT, file_sha256
+
+    logo_dir = os.path.join(www_root, LOGO_DIR)
+    if not os.path.isdir(logo_dir):
+        return {'logos': {}, 'sprite': None}
+    digests = {filename[:-4]: file_sha256(os.path.join(logo_dir, filename))
+               for filename in os.listdir(logo_dir) if filename.endswith('.png') and filename != 'sprite.png'}
+    counts = Counter(digests.values())
+    logos = {code: f"{LOGO_DIR}/{code}.png" for code, digest in digests.items() if counts[digest] < PLACEHOLDER_MIN_COUNT}
+
+    sprite = None
+    sprite_map = os.path.join(logo_dir, 'sprite.json')
+    if os.path.exists(sprite_map):
+        with open(sprite_map) as f:
+            sprite = json.load(f)
+        sprite['image'] = f"{LOGO_DIR}/{sprite['image']}"
+    return {'logos': logos, 'sprite': sprite}
+
+def airport_index_artifact(db):
+    from airport_search_index import build_index
+    return build_index(db.airports.find({}, {'_id': 0, 'iata_code': 1, 'name': 1, 'city': 1, 'country': 1, 'weight': 1}))
+
+def load_manifest(data_dir):
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'artifacts': {}}
+
+def prune(data_dir, keep):
+    """Delete hashed artifacts referenced by neither the current nor the previous manifest."""
+    removed = 0
+    for filename in os.listdir(data_dir):
+        base = filename.split('.json')[0] + '.json'
+        if filename.startswith(MANIFEST_FILE) or base in keep or base.count('.') != 2:
+            continue
+        os.remove(os.path.join(data_dir, filename))
+        removed += 1
+    return removed
+
+def generate(db, www_root=WWW_ROOT):
+    data_dir = os.path.join(www_root, DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+    previous = load_manifest(data_dir)
+
+    builders = {
+        'airports': lambda: airports_artifact(db),
+        'airlines': lambda: airlines_artifact(www_root),
+        'logos': lambda: logos_artifact(www_root),
+        'airport-index': lambda: airport_index_artifact(db),
+    }
+    artifacts = {}
+    for name, build in builders.items():
+        artifacts[name] = write_artifact(data_dir, name, build())
+        entry = artifacts[name]
+        changed = previous['artifacts'].get(name, {}).get('sha256') != entry['sha256']
+        print(f"{name}: {entry['file']} {entry['bytes']} bytes, gzip {entry['gz_bytes']}"
+              f"{', brotli ' + str(entry['br_bytes']) if 'br_bytes' in entry else ''}{'' if changed else ' (unchanged)'}")
+
+    manifest = {'generated_at': datetime.now().strftime('%Y%m%d%H%M%S'), 'artifacts': artifacts}
+    content = encode(manifest)
+    manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+    write_atomic(manifest_path, content)
+    write_atomic(manifest_path + '.gz', compress_gzip(content))
+    brotli_content = compress_brotli(content)
+    if brotli_content is not None:
+        write_atomic(manifest_path + '.br', brotli_content)
+
+    # Clients holding the previous manifest can still fetch its files until the next run
+    keep = {os.path.basename(entry['file']) for entry in list(artifacts.values()) + list(previous['artifacts'].values())}
+    removed = prune(data_dir, keep)
+    print(f"Manifest written to {manifest_path}{f', pruned {removed} old files' if removed else ''}")
+    return manifest
+
+def main():
+    from connections import get_db
+    generate(get_db())
+
+if __name__ == "__main__":
+    main()
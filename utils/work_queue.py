@@ -0,0 +1,339 @@
+import argparse
+import csv
+import os
+import socket
+import threading
+import time
+
+# Item states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+
+LEASE_SECONDS = 120     # A worker that stops heartbeating loses its items after this
+MAX_ATTEMPTS = 5        # Items failing this many times are dead-lettered
+RETRY_DELAY = 30        # Base delay in seconds, doubled on every failed attempt
+POLL_INTERVAL = 2       # Idle wait between lease attempts while other workers hold items
+
+def normalize_items(items):
+    """ Accept plain keys or (key, payload) tuples and yield (key, payload) pairs """
+    for item in items:
+        if isinstance(item, tuple):
+            yield item[0], item[1] or {}
+        else:
+            yield item, {}
+
+def retry_delay(attempts):
+    """ Exponential backoff before a failed item becomes available again """
+    return RETRY_DELAY * 2 ** max(attempts - 1, 0)
+
+class MongoWorkQueue:
+    """Work queue backed by a MongoDB collection, shared by workers on any node."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index([('kind', 1), ('status', 1), ('available_at', 1)])
+        self.collection.create_index([('status', 1), ('lease_expires', 1)])
+
+    def enqueue(self, kind, items, reset=False):
+        """Add items of the given kind; reset=True re-opens finished or dead items for a new sweep."""
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        now = time.time()
+        operations = []
+        for key, payload in normalize_items(items):
+            fresh = {'status': PENDING, 'attempts': 0, 'available_at': now, 'last_error': None}
+            if reset:
+                update = {'$set': {**fresh, 'payload': payload},
+                          '$setOnInsert': {'kind': kind, 'key': key, 'enqueued_at': now}}
+                query = {'_id': f"{kind}:{key}", 'status': {'$ne': LEASED}}
+            else:
+                update = {'$setOnInsert': {**fresh, 'kind': kind, 'key': key, 'payload': payload, 'enqueued_at': now}}
+                query = {'_id': f"{kind}:{key}"}
+            operations.append(UpdateOne(query, update, upsert=True))
+        if not operations:
+            return 0
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            return result.upserted_count + result.modified_count
+        except BulkWriteError as e:
+            # With reset=True a leased item matches no filter and its upsert hits the duplicate _id
+            print(f"Skipped {len(e.details['writeErrors'])} items currently leased by a worker")
+            return e.details['nUpserted'] + e.details['nModified']
+
+    def lease(self, kind, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """Atomically claim the next available item, reclaiming items whose lease has expired.
+
+        Attempts are counted when an item is leased, so an item whose worker keeps crashing
+        is dead-lettered once its last lease expires instead of being re-leased forever.
+        """
+        from pymongo import ReturnDocument
+
+        now = time.time()
+        self.collection.update_many(
+            {'kind': kind, 'status': LEASED, 'lease_expires': {'$lt': now}, 'attempts': {'$gte': max_attempts}},
+            {'$set': {'status': DEAD, 'last_error': 'lease expired', 'finished_at': now},
+             '$unset': {'lease_owner': '', 'lease_expires': ''}}
+        )
+        return self.collection.find_one_and_update(
+            {'kind': kind, '$or': [
+                {'status': PENDING, 'available_at': {'$lte': now}},
+                {'status': LEASED, 'lease_expires': {'$lt': now}, 'attempts': {'$lt': max_attempts}}
+            ]},
+            {'$set': {'status': LEASED, 'lease_owner': worker_id, 'lease_expires': now + lease_seconds},
+             '$inc': {'attempts': 1}},
+            sort=[('available_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def heartbeat(self, item, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extend a lease; returns False if the item was reclaimed by another worker."""
+        result = self.collection.update_one(
+            {'_id': item['_id'], 'status': LEASED, 'lease_owner': worker_id},
+            {'$set': {'lease_expires': time.time() + lease_seconds}}
+        )
+        return result.matched_count == 1
+
+    def complete(self, item, worker_id):
+        result = self.collection.update_one(
+            {'_id': item['_id'], 'status': LEASED, 'lease_owner': worker_id},
+            {'$set': {'status': DONE, 'finished_at': time.time()}, '$unset': {'lease_owner': '', 'lease_expires': ''}}
+        )
+        return result.matched_count == 1
+
+    def fail(self, item, worker_id, error, max_attempts=MAX_ATTEMPTS):
+        """Schedule a retry with backoff, or dead-letter the item once it runs out of attempts."""
+        if item['attempts'] >= max_attempts:
+            changes = {'status': DEAD, 'last_error': str(error), 'finished_at': time.time()}
+        else:
+            changes = {'status': PENDING, 'last_error': str(error),
+                       'available_at': time.time() + retry_delay(item['attempts'])}
+        result = self.collection.update_one(
+            {'_id': item['_id'], 'status': LEASED, 'lease_owner': worker_id},
+            {'$set': changes, '$unset': {'lease_owner': '', 'lease_expires': ''}}
+        )
+        return result.matched_count == 1
+
+    def counts(self, kind):
+        """Return the number of items per status."""
+        pipeline = [{'$match': {'kind': kind}}, {'$group': {'_id': '$status', 'count': {'$sum': 1}}}]
+        return {entry['_id']: entry['count'] for entry in self.collection.aggregate(pipeline)}
+
+    def dead_letters(self, kind):
+        return list(self.collection.find({'kind': kind, 'status': DEAD}))
+
+class LocalWorkQueue:
+    """In-process stand-in for MongoWorkQueue with the same semantics, for tests and single-node runs."""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def enqueue(self, kind, items, reset=False):
+        now = time.time()
+        added = 0
+        with self.lock:
+            for key, payload in normalize_items(items):
+                item_id = f"{kind}:{key}"
+                existing = self.items.get(item_id)
+                if existing and not (reset and existing['status'] != LEASED):
+                    continue
+                self.items[item_id] = {'_id': item_id, 'kind': kind, 'key': key, 'payload': payload,
+                                       'status': PENDING, 'attempts': 0, 'available_at': now,
+                                       'last_error': None, 'enqueued_at': now}
+                added += 1
+        return added
+
+    def lease(self, kind, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        now = time.time()
+        with self.lock:
+            for item in self.items.values():
+                if (item['kind'] == kind and item['status'] == LEASED and item['lease_expires'] < now
+                        and item['attempts'] >= max_attempts):
+                    item.update(status=DEAD, last_error='lease expired', finished_at=now, lease_owner=None)
+            candidates = [item for item in self.items.values() if item['kind'] == kind and (
+                (item['status'] == PENDING and item['available_at'] <= now) or
+                (item['status'] == LEASED and item['lease_expires'] < now))]
+            if not candidates:
+                return None
+            item = min(candidates, key=lambda item: item['available_at'])
+            item.update(status=LEASED, lease_owner=worker_id, lease_expires=now + lease_seconds)
+            item['attempts'] += 1
+            return dict(item)
+
+    def _owned(self, item, worker_id):
+        current = self.items.get(item['_id'])
+        if current and current['status'] == LEASED and current.get('lease_owner') == worker_id:
+            return current
+        return None
+
+    def heartbeat(self, item, worker_id, lease_seconds=LEASE_SECONDS):
+        with self.lock:
+            current = self._owned(item, worker_id)
+            if current:
+                current['lease_expires'] = time.time() + lease_seconds
+            return current is not None
+
+    def complete(self, item, worker_id):
+        with self.lock:
+            current = self._owned(item, worker_id)
+            if current:
+                current.update(status=DONE, finished_at=time.time(), lease_owner=None)
+            return current is not None
+
+    def fail(self, item, worker_id, error, max_attempts=MAX_ATTEMPTS):
+        with self.lock:
+            current = self._owned(item, worker_id)
+            if not current:
+                return False
+            current.update(last_error=str(error), lease_owner=None)
+            if current['attempts'] >= max_attempts:
+                current.update(status=DEAD, finished_at=time.time())
+            else:
+                current.update(status=PENDING, available_at=time.time() + retry_delay(current['attempts']))
+            return True
+
+    def counts(self, kind):
+        with self.lock:
+            counts = {}
+            for item in self.items.values():
+                if item['kind'] == kind:
+                    counts[item['status']] = counts.get(item['status'], 0) + 1
+            return counts
+
+    def dead_letters(self, kind):
+        with self.lock:
+            return [dict(item) for item in self.items.values() if item['kind'] == kind and item['status'] == DEAD]
+
+def keep_alive(queue, item, worker_id, stop, lease_seconds):
+    """ Heartbeat a leased item until stop is set """
+    while not stop.wait(lease_seconds / 3):
+        if not queue.heartbeat(item, worker_id, lease_seconds):
+            print(f"Lost lease on {item['_id']} ({worker_id})")
+            return
+
+def work(queue, kind, handler, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """Lease and process items until none are pending or leased by other workers."""
+    processed = 0
+    while True:
+        item = queue.lease(kind, worker_id, lease_seconds, max_attempts)
+        if item is None:
+            counts = queue.counts(kind)
+            if not counts.get(PENDING) and not counts.get(LEASED):
+                return processed
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_alive, args=(queue, item, worker_id, stop, lease_seconds), daemon=True)
+        heartbeat.start()
+        try:
+            handler(item['key'], item.get('payload') or {}, queue)
+            queue.complete(item, worker_id)
+            processed += 1
+        except Exception as e:
+            print(f"Error processing {item['_id']} on attempt {item['attempts']}: {e}")
+            queue.fail(item, worker_id, e, max_attempts)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+def run_workers(queue, kind, handler, num_workers, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """Run num_workers threads against the queue and return the number of items each completed."""
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    results = {}
+
+    def run(index):
+        worker_id = f"{prefix}-{index}"
+        results[worker_id] = work(queue, kind, handler, worker_id, lease_seconds, max_attempts)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(num_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+# Task handlers, keyed by item kind
+csv_lock = threading.Lock()
+
+def handle_departures(iata_code, payload, queue):
+    """ Scrape a departures board and enqueue each flight for detail scraping """
+    from flights import scrape_departures
+
+    departures = scrape_departures(iata_code)
+    if departures is None:
+        raise RuntimeError(f"Could not fetch the departures board for {iata_code}")
+    if not departures:
+        print(f"No departures found for {iata_code}.")
+        return
+    # Each board scrape starts a new sweep of its flights, so re-open ones finished earlier,
+    # the way flights.py re-scrapes every flight on every run
+    queue.enqueue('flight', [(flight['flight_number'], {'origin': iata_code, 'dest_iata': flight['dest_iata']})
+                             for flight in departures], reset=True)
+
+def handle_flight(flight_number, payload, queue):
+    """ Scrape one flight page and append it to flights.csv; failures are retried by the queue """
+    from flights import scrape_flight_info, write_to_csv
+
+    departure, arrival, duration, error = scrape_flight_info(flight_number)
+    if error:
+        raise RuntimeError(error)
+    with csv_lock:
+        write_to_csv([payload.get('origin'), payload.get('dest_iata'), flight_number, departure, arrival, duration])
+
+TASKS = {
+    'departures': handle_departures,
+    'flight': handle_flight,
+}
+
+def read_iata_codes(file_name):
+    """ Read non-empty IATA codes from an airports CSV """
+    with open(file_name, mode='r', encoding='utf-8') as file:
+        return [row['iata_code'] for row in csv.DictReader(file) if row['iata_code']]
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared scraping work queue")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="Add IATA codes or flight numbers to the queue")
+    enqueue_parser.add_argument('kind', choices=sorted(TASKS))
+    enqueue_parser.add_argument('keys', nargs='*', help="Keys to enqueue (default for departures: IATA codes from --airports)")
+    enqueue_parser.add_argument('--airports', default='filtered_airports.csv')
+    enqueue_parser.add_argument('--reset', action='store_true', help="Re-open finished and dead items")
+
+    work_parser = subparsers.add_parser('work', help="Process queued items on this node")
+    work_parser.add_argument('kind', choices=sorted(TASKS))
+    work_parser.add_argument('--workers', type=int, default=4)
+    work_parser.add_argument('--lease', type=int, default=LEASE_SECONDS)
+    work_parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+
+    status_parser = subparsers.add_parser('status', help="Show item counts and dead letters")
+    status_parser.add_argument('kind', choices=sorted(TASKS))
+
+    args = parser.parse_args()
+    if args.command == 'enqueue' and args.kind == 'flight' and not args.keys:
+        parser.error("enqueue flight needs flight numbers; airport codes are only a default for departures")
+
+    from connections import get_db
+    queue = MongoWorkQueue(get_db()['work_queue'])
+
+    if args.command == 'enqueue':
+        keys = args.keys or read_iata_codes(args.airports)
+        added = queue.enqueue(args.kind, keys, reset=args.reset)
+        print(f"Enqueued {added} {args.kind} items.")
+    elif args.command == 'work':
+        start = time.time()
+        results = run_workers(queue, args.kind, TASKS[args.kind], args.workers, args.lease, args.max_attempts)
+        elapsed = time.time() - start
+        total = sum(results.values())
+        print(f"Processed {total} {args.kind} items with {args.workers} workers in {elapsed:.1f}s.")
+    elif args.command == 'status':
+        print(f"{args.kind}: {queue.counts(args.kind)}")
+        for item in queue.dead_letters(args.kind):
+            print(f"Dead: {item['key']} after {item['attempts']} attempts: {item['last_error']}")
+
+if __name__ == "__main__":
+    main()
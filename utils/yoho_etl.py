@@ -0,0 +1,112 @@
+import argparse
+import importlib
+import time
+
+# Subcommand -> (module, description). Modules are only imported when their command runs,
+# so --help never pays for pymongo, requests or bs4.
+COMMANDS = {
+    'airports': ('airports', "Download OurAirports data, filter by IATA codes and upsert airports"),
+    'routes': ('routes', "Filter routes.csv and upsert routes"),
+    'weights': ('weight_airports', "Recalculate airport weights from route counts"),
+    'price': ('price_flights', "Price every route and upsert priced_routes"),
+    'import': ('flights_import', "Import flights.csv into the flight_schedules collection"),
+    'reprice': ('repricer', "Watch airports and routes and reprice affected routes (runs until stopped)"),
+    'warm-cache': ('cache_warmer', "Pre-populate the API's cheapestFlights and range caches"),
+    'clusters': ('airport_clusters', "Group same-city airports into metro clusters"),
+    'search-index': ('airport_search_index', "Build the airport autocomplete prefix index"),
+    'cheapest-origins': ('cheapest_origins', "Rebuild the per-destination cheapest origins index"),
+    'artifacts': ('static_artifacts', "Write precompressed, content-hashed reference data into www/data for nginx"),
+    'scrape': (None, "Scrape Avionio boards (see --board)"),
+    'harvest': (None, "Sweep Amadeus for every airport (see --amadeus)"),
+}
+
+SCRAPE_MODULES = {
+    'flights': 'flights',
+    'departures': 'departures',
+    'arrivals': 'arrivals',
+    'schedule': 'schedule',
+}
+
+HARVEST_MODULES = {
+    'prod': 'amadeus_prod_flights',
+    'test': 'amadeus_test_flights',
+    'routes': 'amadeus_test_routes',
+    'airports': 'amadeus_test_airports',
+}
+
+def resolve_module(command, args):
+    if command == 'scrape':
+        return SCRAPE_MODULES[args.board]
+    if command == 'harvest':
+        return HARVEST_MODULES[args.amadeus]
+    return COMMANDS[command][0]
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='yoho-etl',
+        description="Run one or more ETL stages in a single process, sharing MongoDB and HTTP connections.",
+        epilog="Stages: " + "; ".join(f"{name}: {help_text}" for name, (_, help_text) in COMMANDS.items()),
+    )
+    parser.add_argument('commands', nargs='+', choices=list(COMMANDS), metavar='command',
+                        help="Stages to run in order, e.g. 'airports routes weights price'")
+    parser.add_argument('--board', choices=sorted(SCRAPE_MODULES), default='flights',
+                        help="Board scraped by 'scrape' (default: flights)")
+    parser.add_argument('--amadeus', choices=sorted(HARVEST_MODULES), default='prod',
+                        help="Amadeus sweep run by 'harvest' (default: prod)")
+    parser.add_argument('--flights-file', default='flights.csv', help="CSV imported by 'import'")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Let 'import' read only rows appended since its last checkpoint")
+    parser.add_argument('--clustered', action='store_true',
+                        help="Let 'harvest' sweep metro-area member airports less often than their representative")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile each stage (cProfile, sampled stacks, tracemalloc) into profiles/")
+    parser.add_argument('--spool', action='store_true',
+                        help="Let 'harvest' and 'scrape --board flights' write through the durable local spool, "
+                             "draining into MongoDB in the background")
+    parser.add_argument('--probe-all', action='store_true',
+                        help="Let 'harvest' and 'scrape' re-query keys that recently returned no data")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Rebuild 'routes' and 'price' into shadow collections and swap them in atomically")
+    return parser
+
+def run_stage(command, module, args):
+    if command == 'import':
+        module.main(args.flights_file, incremental=args.incremental)
+    elif command in ('warm-cache', 'cheapest-origins'):
+        module.main([])  # These parse their own options; run them with defaults
+    elif command in ('routes', 'price'):
+        module.main(rebuild=args.rebuild)
+    elif command == 'harvest' and args.amadeus in ('prod', 'test'):
+        module.main(clustered=args.clustered, spool=args.spool, probe_all=args.probe_all)
+    elif (command == 'harvest' and args.amadeus == 'routes') or (command == 'scrape' and args.board == 'flights'):
+        module.main(spool=args.spool, probe_all=args.probe_all)
+    elif command == 'scrape' and args.board in ('departures', 'arrivals', 'schedule'):
+        module.main(probe_all=args.probe_all)
+    else:
+        module.main()
+
+def run(commands, args):
+    """Run each stage's main() in order, reusing the process-wide connections."""
+    for command in commands:
+        module = importlib.import_module(resolve_module(command, args))
+        print(f"== {command} ({module.__name__})")
+        start = time.perf_counter()
+        if args.profile:
+            from profiling import profile_run
+            with profile_run(command):
+                run_stage(command, module, args)
+        else:
+            run_stage(command, module, args)
+        print(f"== {command} finished in {time.perf_counter() - start:.1f}s")
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        run(args.commands, args)
+    finally:
+        # Only close what was actually opened; importing connections is free
+        import connections
+        connections.close()
+
+if __name__ == "__main__":
+    main()
@@ -291,8 +291,8 @@ const flightMap = {
         }
         
         try {
-            const response = await fetch(`https://yonderhop.com/api/airports?zoom=${currentZoom}`);
-            const data = await response.json();
+            const data = await this.fetchAirportsArtifact()
+                .catch(() => fetch(`https://yonderhop.com/api/airports?zoom=${currentZoom}`).then(response => response.json()));
             
             // Store the data in localStorage with a timestamp
             localStorage.setItem(cacheKey, JSON.stringify({ data, timestamp: Date.now() })); 
@@ -309,6 +309,16 @@ const flightMap = {
         }
     },
     
+    // Prebuilt, precompressed airport list written by utils/static_artifacts.py and served by nginx
+    async fetchAirportsArtifact() {
+        const manifestResponse = await fetch('/data/manifest.json');
+        if (!manifestResponse.ok) throw new Error(`Manifest unavailable: ${manifestResponse.status}`);
+        const { artifacts } = await manifestResponse.json();
+        const response = await fetch(`/${artifacts.airports.file}`);
+        if (!response.ok) throw new Error(`Airports artifact unavailable: ${response.status}`);
+        return response.json();
+    },
+
     getAirportDataByIata(iata) {
         if (this.airportDataCache && this.airportDataCache[iata]) {
             return Promise.resolve(this.airportDataCache[iata]);